@@ -1,33 +1,59 @@
 import os
-import uuid
-import pandas as pd
-from flask import Flask, request, jsonify, send_from_directory
-from sqlalchemy import create_engine
+from datetime import date
+from flask import Flask, Response, request, jsonify, send_from_directory
 from sqlalchemy.orm import sessionmaker
 from collections import defaultdict
 from flask_cors import CORS 
 
 # --- Import custom modules ---
-from models import Base, Teacher, Student, Course, Classroom, Feedback, StudentElective
-from utils import load_csv_to_db
-from solver import AntColonyTimetableSolver
+from models import (Base, Teacher, Student, Course, Classroom, Feedback, StudentElective, TIMETABLE_DATA_VERSION,
+                    bump_data_version, create_db_engine, upgrade_schema)
+from utils import ingest_csv, INGEST_MODES
+from solver import AntColonyTimetableSolver, DEFAULT_CONSTRAINTS, LOCAL_SEARCH_PASSES
+from jobs import JobManager
+from reference_cache import ReferenceCache
+from result_cache import ResultCache, cacheable, solver_fingerprint
+from storage import save_timetable, save_cancellation_request, resolve_cancellation_request, save_substitution
+from timetable_store import TimetableStore
+from export import EXPORT_FORMATS, EXPORT_GROUPINGS, TERM_WEEKS, stream_export
 
 # --- Configuration & Setup ---
-DATABASE_URL = "sqlite:///timetable.db"
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///timetable.db")
+SOLVER_CACHE_DIR = os.environ.get("SOLVER_CACHE_DIR", "solver_cache")
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER): os.makedirs(UPLOAD_FOLDER)
 
 app = Flask(__name__, static_url_path='', static_folder='.')
 CORS(app) 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-engine = create_engine(DATABASE_URL)
+engine = create_db_engine(DATABASE_URL)
 Base.metadata.create_all(engine)
+upgrade_schema(engine)
 Session = sessionmaker(bind=engine)
+# Reference tables served from memory. Their version, kept in the database, is bumped in the
+# transaction of every change to them, i.e. whenever solver input data changes; every worker
+# reloads when it moves, and generation jobs are deduplicated per version.
+REFERENCE_DATA = ReferenceCache(Session)
+# Solved timetables on disk, keyed by a fingerprint of the solver inputs (LRU-evicted);
+# the directory is created by the first stored result.
+RESULT_CACHE = ResultCache(SOLVER_CACHE_DIR)
 
-# --- Global variables for temporary storage ---
-GENERATED_TIMETABLE = None
-CANCELLATION_REQUESTS = [] 
-SUBSTITUTION_OFFERS = []
+# --- In-memory copy of the published timetable (persisted in timetable_entries) ---
+# Handlers read TIMETABLES.get() once per request: a snapshot of the timetable, its
+# index and the substitution engine with pending requests and offers. Cancellations,
+# substitutions and regenerations publish a new snapshot through TIMETABLES.update()
+# or publish(), one writer at a time. Each write bumps the shared timetable data version
+# and logs the change, which the other workers replay within TIMETABLE_RECHECK_SECONDS.
+TIMETABLES = TimetableStore(Session, REFERENCE_DATA)
+# Iterations without improvement before an incremental re-solve stops, unless the request sets patience.
+INCREMENTAL_PATIENCE = 10
+
+def conditional_json(body, etag):
+    """Serves a pre-serialized JSON body with its ETag, answering 304 when the client's copy is current."""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 # --- HTML Page Serving ---
 @app.route('/')
@@ -44,24 +70,23 @@ def handle_csv_upload(filename, db_model):
     if 'file' not in request.files: return jsonify({"error": "No file part"}), 400
     file = request.files['file']
     if file.filename == '': return jsonify({"error": "No file selected"}), 400
+    mode = request.args.get('mode') or request.form.get('mode') or 'replace'
+    if mode not in INGEST_MODES: return jsonify({"error": f"Mode must be one of {', '.join(INGEST_MODES)}."}), 400
     if file and file.filename.endswith('.csv'):
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
         try:
-            db_session = Session()
-            db_session.query(db_model).delete()
-            df = pd.read_csv(filepath)
-            if not df.empty:
-                records = df.to_dict(orient='records')
-                db_session.bulk_insert_mappings(db_model, records)
-            db_session.commit()
-            return jsonify({"message": f"{db_model.__name__} data uploaded!"}), 201
-        except pd.errors.EmptyDataError:
-             db_session.commit()
-             return jsonify({"message": f"Processed empty file for {db_model.__name__}."}), 200
+            with engine.begin() as connection:
+                stats = ingest_csv(filepath, db_model, connection, mode=mode)
+                if stats["inserted"] or stats["updated"] or stats["deleted"]:
+                    REFERENCE_DATA.invalidate(connection)
+                    # Published snapshots hold the teachers, courses and rooms: every worker reloads its timetable.
+                    if db_model in (Teacher, Course, Classroom): bump_data_version(connection, TIMETABLE_DATA_VERSION)
         except Exception as e:
-            db_session.rollback(); return jsonify({"error": f"Failed: {str(e)}"}), 500
-        finally: db_session.close()
+            return jsonify({"error": f"Failed: {str(e)}"}), 500
+        if not (stats["inserted"] or stats["updated"] or stats["unchanged"]):
+            return jsonify({"message": f"Processed empty file for {db_model.__name__}.", **stats}), 200
+        return jsonify({"message": f"{db_model.__name__} data uploaded!", **stats}), 201
     else: return jsonify({"error": "Invalid file type"}), 400
 
 # --- API Endpoints ---
@@ -77,107 +102,196 @@ def upload_classrooms_csv(): return handle_csv_upload('classrooms.csv', Classroo
 @app.route('/api/admin/upload/feedback', methods=['POST'])
 def upload_feedback_csv(): return handle_csv_upload('feedback.csv', Feedback)
 
+def run_generation_job(job):
+    """
+    Background body of a generation job: loads data, solves and publishes the result.
+    Incremental jobs warm-start from the published timetable and only re-place the groups
+    whose inputs changed. Other jobs are memoized in RESULT_CACHE by a fingerprint of the
+    solver inputs when seeded or when they reach target_score, so re-generating unchanged
+    data publishes the stored result at once.
+    The solver's pre-solve report is kept in job.feasibility. Entries it prunes (no eligible
+    teacher or room) are left out and the rest is solved; a job whose demand exceeds a hard
+    bound fails at once, unless allow_infeasible is set.
+    """
+    reference = REFERENCE_DATA.get()
+    constraints = dict(DEFAULT_CONSTRAINTS)
+    if not all((reference.teachers, reference.students, reference.courses, reference.classrooms)): raise ValueError("Not enough base data.")
+    solve_options = dict(job.options)
+    local_search_passes = solve_options.pop('local_search_passes', None)
+    if local_search_passes is None: local_search_passes = LOCAL_SEARCH_PASSES
+    seed, use_cache = solve_options.pop('seed', None), solve_options.pop('use_cache', True)
+    allow_infeasible = solve_options.pop('allow_infeasible', False)
+    published = TIMETABLES.get().timetable
+    incremental = bool(solve_options.pop('incremental', False) and published)
+    # Incremental results also depend on the published timetable, so they are not memoized.
+    fingerprint_options = {**solve_options, 'local_search_passes': local_search_passes, 'seed': seed, 'allow_infeasible': allow_infeasible}
+    fingerprint = None if incremental else solver_fingerprint(reference, constraints, fingerprint_options)
+    cached = RESULT_CACHE.get(fingerprint, reference) if fingerprint and use_cache else None
+    if cached:
+        final_timetable, job.best_score, job.stop_reason = cached
+        job.cached = True
+    else:
+        solver = AntColonyTimetableSolver(*reference.solver_args(), constraints, seed=seed, local_search_passes=local_search_passes)
+        job.metrics, job.feasibility = solver.metrics, solver.feasibility
+        if not (solver.feasibility['feasible'] or allow_infeasible):
+            raise ValueError("The demand cannot be met without clashes with these teachers, rooms and slots; see feasibility, or set allow_infeasible.")
+        if incremental:
+            solver.warm_start(published)
+            solve_options.setdefault('patience', INCREMENTAL_PATIENCE)
+        final_timetable = solver.solve(on_progress=job.update_progress, should_stop=job.should_stop, **solve_options)
+        job.best_score, job.stop_reason = solver.best_timetable_score, solver.stop_reason
+        if job.should_stop(): return None
+        if not final_timetable: raise ValueError("Failed to generate a valid timetable.")
+        if fingerprint and cacheable(seed, solve_options.get('target_score', 0), job.best_score,
+                                           solve_options.get('time_budget'), job.stop_reason):
+            RESULT_CACHE.put(fingerprint, final_timetable, job.best_score, job.stop_reason)
+    job.version_id = TIMETABLES.publish(final_timetable, reference.teachers,
+                                        lambda snapshot: save_timetable(Session, final_timetable, job.best_score, job.dataset_version, snapshot))
+    return final_timetable
+
+# Job state is kept in generation_jobs, so any worker can report on a job another one runs.
+JOBS = JobManager(run_generation_job, Session)
+
 @app.route('/api/admin/generate-timetable', methods=['POST'])
 def generate_timetable():
-    global GENERATED_TIMETABLE, CANCELLATION_REQUESTS, SUBSTITUTION_OFFERS
-    GENERATED_TIMETABLE, CANCELLATION_REQUESTS, SUBSTITUTION_OFFERS = None, [], []
-    db_session = Session()
+    options = request.get_json(silent=True) or {}
     try:
-        teachers, students, courses, classrooms, feedback = db_session.query(Teacher).all(), db_session.query(Student).all(), db_session.query(Course).all(), db_session.query(Classroom).all(), db_session.query(Feedback).all()
-        elective_choices = db_session.query(StudentElective).all()
-        constraints = {"working_days": 5, "periods_per_day": 8, "minimum_total_credits": 120}
-        if not all((teachers, students, courses, classrooms)): return jsonify({"error": "Not enough base data."}), 400
-        solver = AntColonyTimetableSolver(courses, teachers, students, classrooms, feedback, elective_choices, constraints)
-        final_timetable = solver.solve()
-        if final_timetable:
-            GENERATED_TIMETABLE = final_timetable
-            return jsonify({"message": "Semester-aware timetables generated!", "best_score": solver.best_timetable_score}), 200
-        else:
-            GENERATED_TIMETABLE = None
-            return jsonify({"error": "Failed to generate a valid timetable."}), 500
-    finally:
-        db_session.close()
+        solve_options = {key: (None if options[key] is None else cast(options[key]))
+                         for key, cast in (('time_budget', float), ('target_score', float), ('patience', int), ('local_search_passes', int), ('seed', int))
+                         if key in options}
+    except (TypeError, ValueError):
+        return jsonify({"error": "time_budget, target_score, patience, local_search_passes and seed must be numbers."}), 400
+    if options.get('incremental'): solve_options['incremental'] = True
+    if options.get('use_cache') is False: solve_options['use_cache'] = False
+    if options.get('allow_infeasible'): solve_options['allow_infeasible'] = True
+    job, created = JOBS.submit(REFERENCE_DATA.version, solve_options)
+    message = "Timetable generation started." if created else "A generation job for this data is already in progress."
+    return jsonify({"message": message, **job.to_dict()}), 202
+
+@app.route('/api/admin/jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    job = JOBS.get(job_id)
+    if not job: return jsonify({"error": "Job not found."}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/admin/jobs/<job_id>/result', methods=['GET'])
+def get_generation_job_result(job_id):
+    job = JOBS.get(job_id)
+    if not job: return jsonify({"error": "Job not found."}), 404
+    if job.status != 'succeeded': return jsonify({"error": f"Job is {job.status}.", **job.to_dict()}), 409
+    result = job.result
+    if result is None:
+        # Run by another worker: its result is the published timetable, unless a newer one replaced it.
+        snapshot = TIMETABLES.get()
+        if snapshot.version != job.version_id: return jsonify({"error": "A newer timetable has been published since.", **job.to_dict()}), 410
+        result = snapshot.timetable
+    timetable = [{
+        "course_id": entry['course'].id, "course_name": entry['course'].course_name,
+        "teacher_id": entry['teacher'].id, "room_id": entry['room'].id, "room_name": entry['room'].location,
+        "slot": entry['slot'], "group": entry['group'], "students": entry['students'],
+    } for entry in result.entries()]
+    return jsonify({**job.to_dict(), "timetable": timetable})
+
+@app.route('/api/admin/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_generation_job(job_id):
+    job = JOBS.cancel(job_id)
+    if not job: return jsonify({"error": "Job not found."}), 404
+    return jsonify({"message": "Cancellation requested.", **job.to_dict()}), 200
+
+@app.route('/api/admin/solver-metrics', methods=['GET'])
+def get_solver_metrics():
+    """Phase timings, placement counters and score history for a job, by default the latest one."""
+    job_id = request.args.get('job_id')
+    job = JOBS.get(job_id) if job_id else JOBS.latest()
+    if not job: return jsonify({"error": "Job not found."}), 404
+    metrics = job.metrics_dict()
+    if metrics is None: return jsonify({"error": f"Job is {job.status}; no metrics recorded yet.", **job.to_dict()}), 409
+    return jsonify({**job.to_dict(), "metrics": metrics})
+
+@app.route('/api/admin/feasibility', methods=['GET'])
+def get_feasibility():
+    """The solver's pre-solve demand report for the current data (see AntColonyTimetableSolver._plan_demand), without solving."""
+    reference = REFERENCE_DATA.get()
+    if not all((reference.teachers, reference.students, reference.courses, reference.classrooms)): return jsonify({"error": "Not enough base data."}), 409
+    solver = AntColonyTimetableSolver(*reference.solver_args(), dict(DEFAULT_CONSTRAINTS))
+    return jsonify({"dataset_version": reference.version, **solver.feasibility})
+
+@app.route('/api/admin/export/timetable', methods=['GET'])
+def export_timetable():
+    """
+    Streams the whole published timetable for bulk consumers such as an LMS sync, grouped
+    by ?by=student|teacher|room|group, as ?format=csv|jsonl|ics. Calendar events start on
+    or after ?term_start (ISO date, default today) and repeat weekly for ?weeks weeks.
+    """
+    fmt, by = request.args.get('format', 'csv'), request.args.get('by', 'student')
+    if fmt not in EXPORT_FORMATS: return jsonify({"error": f"Format must be one of {', '.join(EXPORT_FORMATS)}."}), 400
+    if by not in EXPORT_GROUPINGS: return jsonify({"error": f"Grouping must be one of {', '.join(EXPORT_GROUPINGS)}."}), 400
+    try: term_start = date.fromisoformat(request.args['term_start']) if request.args.get('term_start') else None
+    except ValueError: return jsonify({"error": "term_start must be an ISO date."}), 400
+    weeks = request.args.get('weeks', str(TERM_WEEKS))
+    if not (weeks.isascii() and weeks.isdigit() and int(weeks) >= 1): return jsonify({"error": "weeks must be a whole number of at least 1."}), 400
+    snapshot = TIMETABLES.get()
+    if not snapshot.timetable: return jsonify({"error": "No timetable generated."}), 404
+    body = stream_export(snapshot.timetable, snapshot.index, fmt, by, term_start=term_start, weeks=int(weeks))
+    return Response(body, mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=timetable-v{snapshot.version}-{by}.{fmt}'})
 
 @app.route('/api/admin/cancellation-requests', methods=['GET'])
 def get_cancellation_requests():
-    return jsonify(CANCELLATION_REQUESTS)
+    return jsonify(list(TIMETABLES.get().substitutions.cancellation_requests.values()))
 
 @app.route('/api/admin/status', methods=['GET'])
 def get_admin_status():
     db_ok = False
     counts = {}
-    db_session = None
     try:
-        db_session = Session()
-        counts = {
-            "teachers": db_session.query(Teacher).count(),
-            "students": db_session.query(Student).count(),
-            "courses": db_session.query(Course).count(),
-            "classrooms": db_session.query(Classroom).count(),
-            "feedback": db_session.query(Feedback).count(),
-            "elective_choices": db_session.query(StudentElective).count(),
-        }
+        counts = REFERENCE_DATA.get().counts
         db_ok = True
     except Exception:
         db_ok = False
-    finally:
-        try:
-            if db_session is not None:
-                db_session.close()
-        except Exception:
-            pass
+    snapshot = TIMETABLES.get()
     uploads_present = {name: os.path.exists(os.path.join(UPLOAD_FOLDER, f"{name}.csv")) for name in ["teachers","students","courses","classrooms","feedback"]}
     return jsonify({
         "db_connected": db_ok,
         "counts": counts,
         "uploads": uploads_present,
-        "timetable_generated": GENERATED_TIMETABLE is not None and len(GENERATED_TIMETABLE) > 0,
-        "pending_requests": len(CANCELLATION_REQUESTS),
-        "substitution_offers": len(SUBSTITUTION_OFFERS),
+        "timetable_generated": snapshot.timetable is not None and len(snapshot.timetable) > 0,
+        "pending_requests": len(snapshot.substitutions.cancellation_requests),
+        "substitution_offers": len(snapshot.substitutions.offers),
     })
 
 @app.route('/api/admin/handle-cancellation', methods=['POST'])
 def handle_cancellation():
-    global GENERATED_TIMETABLE, CANCELLATION_REQUESTS, SUBSTITUTION_OFFERS
     data = request.json
     req_id, action = data.get('request_id'), data.get('action')
     if not all((req_id, action)): return jsonify({"error": "Missing data"}), 400
-    original_request = next((req for req in CANCELLATION_REQUESTS if req['id'] == req_id), None)
-    if not original_request: return jsonify({"error": "Request ID not found."}), 404
-    CANCELLATION_REQUESTS = [req for req in CANCELLATION_REQUESTS if req['id'] != req_id]
-    if action == 'approve' and GENERATED_TIMETABLE:
-        cancelled_class_entry = None
-        for i, entry in enumerate(GENERATED_TIMETABLE):
-            if entry['teacher'].id == original_request['teacher_id'] and entry['slot'] == original_request['slot']:
-                cancelled_class_entry = GENERATED_TIMETABLE.pop(i)
-                break
-        if cancelled_class_entry:
-            db_session = Session()
-            all_teachers = db_session.query(Teacher).all()
-            db_session.close()
-            occupied_slots = { (e['teacher'].id, e['slot']) for e in GENERATED_TIMETABLE }
-            for teacher in all_teachers:
-                is_free = (teacher.id, cancelled_class_entry['slot']) not in occupied_slots
-                can_teach = cancelled_class_entry['course'].course_name in (teacher.first_preference, teacher.second_preference)
-                if teacher.id != original_request['teacher_id'] and is_free and can_teach:
-                    offer_details = {"course_id": cancelled_class_entry['course'].id, "group": cancelled_class_entry['group'], "students": cancelled_class_entry['students'], "room_id": cancelled_class_entry['room'].id, "slot": cancelled_class_entry['slot']}
-                    offer = {"id": str(uuid.uuid4()), "details": offer_details, "course_name": cancelled_class_entry['course'].course_name, "group": cancelled_class_entry['group'], "students": cancelled_class_entry['students'], "slot": cancelled_class_entry['slot'], "offered_to_teacher_id": teacher.id}
-                    SUBSTITUTION_OFFERS.append(offer)
-    return jsonify({"message": f"Request {action}d."}), 200
+    if action not in ('approve', 'reject'): return jsonify({"error": "Action must be 'approve' or 'reject'."}), 400
+
+    def resolve(draft):
+        substitutions = draft.substitutions
+        original_request = substitutions.cancellation_requests.get(str(req_id))
+        if not original_request: return jsonify({"error": "Request ID not found."}), 404
+        cancelled_row, substitute_teachers = None, []
+        if action == 'approve':
+            cancelled_row = substitutions.row_for_id(original_request['timetable_entry_id'])
+            if cancelled_row is not None: substitute_teachers = substitutions.substitutes_for(cancelled_row)
+        offer_ids = resolve_cancellation_request(Session, original_request['id'], action,
+                                                 original_request['timetable_entry_id'] if cancelled_row is not None else None, substitute_teachers, snapshot=draft)
+        draft.resolve_request(original_request['id'], cancelled_row, list(zip(offer_ids, substitute_teachers)))
+        return jsonify({"message": f"Request {action}d."}), 200
+    return TIMETABLES.update(resolve)
 
 # --- Student Routes ---
 @app.route('/api/student/available-electives', methods=['GET'])
 def get_available_electives():
     student_id = request.args.get('student_id'); program = request.args.get('program')
     if not student_id or not program: return jsonify({"error": "Student ID and Program are required."}), 400
-    db_session = Session()
-    try:
-        elective_types = ["Minor", "Skill-Based", "Ability Enhancement", "Value-Added"]
-        available = db_session.query(Course).filter(Course.program_name == program, Course.course_type.in_(elective_types)).all()
-        selected_ids = {se.course_id for se in db_session.query(StudentElective).filter_by(student_id=student_id).all()}
-        data = [{"id": c.id, "course_name": c.course_name, "credits": c.credits, "course_type": c.course_type, "is_selected": c.id in selected_ids} for c in available]
-        return jsonify({"electives": data}), 200
-    finally: db_session.close()
+    reference = REFERENCE_DATA.get()
+    elective_types = ["Minor", "Skill-Based", "Ability Enhancement", "Value-Added"]
+    available = [c for c in reference.courses if c.program_name == program and c.course_type in elective_types]
+    selected_ids = set(reference.electives_by_student.get(student_id, ()))
+    data = [{"id": c.id, "course_name": c.course_name, "credits": c.credits, "course_type": c.course_type, "is_selected": c.id in selected_ids} for c in available]
+    return jsonify({"electives": data}), 200
 
 @app.route('/api/student/save-electives', methods=['POST'])
 def save_student_electives():
@@ -189,6 +303,7 @@ def save_student_electives():
         db_session.query(StudentElective).filter_by(student_id=student_id).delete()
         for course_id in course_ids:
             db_session.add(StudentElective(student_id=student_id, course_id=int(course_id)))
+        REFERENCE_DATA.invalidate(db_session)
         db_session.commit()
         return jsonify({"message": "Your elective choices have been saved!"}), 201
     finally: db_session.close()
@@ -197,72 +312,54 @@ def save_student_electives():
 def get_student_timetable():
     student_id = request.args.get('student_id')
     if not student_id: return jsonify({"error": "Student ID must be provided."}), 400
-    if GENERATED_TIMETABLE is None: return jsonify({"error": "No timetable has been generated."}), 404
-    student_schedule = []
-    for entry in GENERATED_TIMETABLE:
-        if student_id in entry['students']:
-            day, period = entry['slot'].split('_')
-            student_schedule.append({
-                "day": day, "period": int(period), "course_name": entry['course'].course_name,
-                "teacher_name": entry['teacher'].id, "room_name": entry['room'].location,
-            })
-    return jsonify({"timetable": student_schedule, "days": ["Mon", "Tue", "Wed", "Thu", "Fri"], "periods": 8})
+    snapshot = TIMETABLES.get()
+    if snapshot.timetable is None: return jsonify({"error": "No timetable has been generated."}), 404
+    return conditional_json(*snapshot.index.student_response(student_id))
 
 # --- Teacher Routes ---
 @app.route('/api/teacher/timetable', methods=['GET'])
 def get_teacher_timetable():
     teacher_id = request.args.get('teacher_id')
     if not teacher_id: return jsonify({"error": "Teacher ID required."}), 400
-    if not GENERATED_TIMETABLE: return jsonify({"error": "No timetable generated."}), 404
-    teacher_schedule, total_hours = [], 0
-    for entry in GENERATED_TIMETABLE:
-        if entry['teacher'].id == teacher_id:
-            day, period = entry['slot'].split('_')
-            teacher_schedule.append({
-                "day": day, "period": int(period), "course_name": entry['course'].course_name,
-                "group": entry['group'],
-                "students": entry['students'],
-                "room_name": entry['room'].location,
-            })
-            total_hours += 1
-    workload_left = 20 - total_hours 
-    return jsonify({"timetable": teacher_schedule, "days": ["Mon", "Tue", "Wed", "Thu", "Fri"], "periods": 8, "workload": workload_left})
+    snapshot = TIMETABLES.get()
+    if not snapshot.timetable: return jsonify({"error": "No timetable generated."}), 404
+    return conditional_json(*snapshot.index.teacher_response(teacher_id))
 
 @app.route('/api/teacher/cancel-class', methods=['POST'])
 def cancel_class():
     data = request.json
     if not data: return jsonify({"error": "Invalid request"}), 400
-    data['id'] = str(uuid.uuid4())
-    CANCELLATION_REQUESTS.append(data)
-    return jsonify({"message": "Request received and pending approval."}), 201
+
+    def request_cancellation(draft):
+        row = draft.substitutions.entry_at(data.get('teacher_id'), data.get('slot'))
+        if row is None: return jsonify({"error": "No such class in the current timetable."}), 404
+        entry = draft.timetable.entry(row)
+        draft.add_request(save_cancellation_request(Session, entry['id'], entry['teacher'].id, snapshot=draft), row)
+        return jsonify({"message": "Request received and pending approval."}), 201
+    return TIMETABLES.update(request_cancellation)
 
 @app.route('/api/teacher/substitution-offers', methods=['GET'])
 def get_substitution_offers():
     teacher_id = request.args.get('teacher_id')
     if not teacher_id: return jsonify({"error": "Teacher ID required."}), 400
-    offers_for_teacher = [o for o in SUBSTITUTION_OFFERS if o['offered_to_teacher_id'] == teacher_id]
-    return jsonify(offers_for_teacher)
+    return jsonify(TIMETABLES.get().substitutions.offers_for_teacher(teacher_id))
 
 @app.route('/api/teacher/accept-substitution', methods=['POST'])
 def accept_substitution():
-    global GENERATED_TIMETABLE, SUBSTITUTION_OFFERS
     data = request.json
     offer_id, accepting_teacher_id = data.get('offer_id'), data.get('accepting_teacher_id')
     if not all((offer_id, accepting_teacher_id)): return jsonify({"error": "Missing data"}), 400
-    offer_found = next((o for o in SUBSTITUTION_OFFERS if o['id'] == offer_id), None)
-    if not offer_found: return jsonify({"error": "Offer not found or already taken."}), 404
-    details = offer_found['details']
-    db_session = Session()
-    new_teacher = db_session.query(Teacher).filter_by(id=accepting_teacher_id).first()
-    course = db_session.query(Course).filter_by(id=details['course_id']).first()
-    room = db_session.query(Classroom).filter_by(id=details['room_id']).first()
-    db_session.close()
-    if not all((new_teacher, course, room)):
-        return jsonify({"error": "Database inconsistency found."}), 500
-    new_class_entry = {'course': course, 'teacher': new_teacher, 'group': details['group'], 'students': details['students'], 'room': room, 'slot': details['slot']}
-    GENERATED_TIMETABLE.append(new_class_entry)
-    SUBSTITUTION_OFFERS = [o for o in SUBSTITUTION_OFFERS if o['details'] != offer_found['details']]
-    return jsonify({"message": "Substitution successful! Your timetable has been updated."}), 200
+
+    def accept(draft):
+        substitutions = draft.substitutions
+        offer_found = substitutions.get_offer(offer_id)
+        if not offer_found: return jsonify({"error": "Offer not found or already taken."}), 404
+        new_teacher = substitutions.teachers_by_id.get(accepting_teacher_id)
+        if not new_teacher: return jsonify({"error": "Database inconsistency found."}), 500
+        cancelled_entry_id = offer_found['cancelled_entry_id']
+        draft.substitute(cancelled_entry_id, new_teacher, save_substitution(Session, offer_found['id'], cancelled_entry_id, new_teacher.id, snapshot=draft))
+        return jsonify({"message": "Substitution successful! Your timetable has been updated."}), 200
+    return TIMETABLES.update(accept)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,128 @@
+"""
+Solves a dataset without the web app, e.g. for nightly what-if runs from cron, and
+writes the timetable to a file and/or publishes it as a new timetable version:
+
+    python batch_solve.py --csv-dir data/ --seed 1 --output timetable.csv
+    python batch_solve.py --db sqlite:///timetable.db --time-budget 600 --publish
+
+The input is read straight from the CSV files (or the database), and only what the
+chosen input and output need is imported: never Flask or pandas, SQLAlchemy only with
+--db, and the solver only after the arguments are parsed. A JSON summary is printed to stdout.
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date
+
+from export import EXPORT_FORMATS, EXPORT_GROUPINGS, TERM_WEEKS, stream_export
+from timetable_index import TimetableIndex
+
+
+def _load(args):
+    """The reference data, and the engine when reading from a database."""
+    if args.csv_dir:
+        from reference_data import load_csv_dataset
+        return load_csv_dataset(args.csv_dir), None
+    from sqlalchemy.orm import sessionmaker
+    from models import Base, create_db_engine, upgrade_schema
+    from reference_cache import ReferenceCache
+    engine = create_db_engine(args.db)
+    # The reference data version and timetable tables may be newer than the database.
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine)
+    return ReferenceCache(sessionmaker(bind=engine)).get(), engine
+
+
+def _publish(engine, timetable, best_score):
+    """Saves the timetable as a new version; the workers of a running app reload it on their next request."""
+    from sqlalchemy.orm import sessionmaker
+    from storage import save_timetable
+    return save_timetable(sessionmaker(bind=engine), timetable, best_score, None)
+
+
+def _print_progress(progress):
+    print(json.dumps(progress), file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv-dir", help="directory with teachers.csv, students.csv, courses.csv and classrooms.csv, "
+                                          "and optionally feedback.csv and student_electives.csv")
+    source.add_argument("--db", help="database URL to read the reference tables from, e.g. sqlite:///timetable.db")
+    parser.add_argument("--iterations", type=int, help="colony iterations (default: the solver's NUM_ITERATIONS)")
+    parser.add_argument("--ants", type=int, help="ants per iteration (default: the solver's NUM_ANTS)")
+    parser.add_argument("--seed", type=int, help="seed for a reproducible solve")
+    parser.add_argument("--time-budget", type=float, help="seconds after which the solve stops")
+    parser.add_argument("--target-score", type=float, default=0, help="stop once the best score reaches this")
+    parser.add_argument("--patience", type=int, help="stop after this many iterations without improvement")
+    parser.add_argument("--local-search-passes", type=int, help="repair passes per ant (default: the solver's LOCAL_SEARCH_PASSES)")
+    parser.add_argument("--allow-infeasible", action="store_true", help="solve even if the pre-solve check finds the demand cannot be met without clashes")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for ant construction and components")
+    parser.add_argument("--cache-dir", help="memoize results here, keyed by a fingerprint of the inputs and options")
+    parser.add_argument("--output", help="write the timetable to this file")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), help="output format (default: from the --output extension)")
+    parser.add_argument("--by", choices=EXPORT_GROUPINGS, default="group", help="grouping of the output file")
+    parser.add_argument("--term-start", type=date.fromisoformat, help="first day of calendar (ics) output, as an ISO date")
+    parser.add_argument("--weeks", type=int, default=TERM_WEEKS, help="weeks of calendar (ics) output")
+    parser.add_argument("--publish", action="store_true", help="save the result as a new timetable version in --db")
+    parser.add_argument("--progress", action="store_true", help="print per-iteration progress to stderr")
+    args = parser.parse_args(argv)
+    fmt = args.format or (args.output.rsplit('.', 1)[-1] if args.output and '.' in args.output else None)
+    if args.output and fmt not in EXPORT_FORMATS: parser.error(f"cannot tell the output format of {args.output}; pass --format")
+    if args.publish and not args.db: parser.error("--publish needs --db")
+    if not (args.output or args.publish): parser.error("nothing to do: pass --output and/or --publish")
+
+    started = time.perf_counter()
+    reference, engine = _load(args)
+    import solver as solver_module
+    loaded = time.perf_counter()
+    summary = {"load_s": loaded - started, "cached": False}
+    if not all((reference.teachers, reference.students, reference.courses, reference.classrooms)):
+        print("Not enough base data: teachers, students, courses and classrooms are all required.", file=sys.stderr)
+        return 1
+
+    constraints = dict(solver_module.DEFAULT_CONSTRAINTS)
+    settings = {"num_ants": args.ants or solver_module.NUM_ANTS, "num_iterations": args.iterations or solver_module.NUM_ITERATIONS,
+                "local_search_passes": solver_module.LOCAL_SEARCH_PASSES if args.local_search_passes is None else args.local_search_passes}
+    solve_options = {"time_budget": args.time_budget, "target_score": args.target_score, "patience": args.patience}
+    cache = fingerprint = cached = None
+    if args.cache_dir:
+        from result_cache import ResultCache, cacheable, solver_fingerprint
+        cache = ResultCache(args.cache_dir)
+        fingerprint = solver_fingerprint(reference, constraints, {**solve_options, **settings, "seed": args.seed, "allow_infeasible": args.allow_infeasible})
+        cached = cache.get(fingerprint, reference)
+    if cached:
+        timetable, best_score, stop_reason = cached
+        summary["cached"] = True
+    else:
+        solver = solver_module.AntColonyTimetableSolver(*reference.solver_args(), constraints, seed=args.seed, num_workers=args.workers, **settings)
+        summary.update(feasible=solver.feasibility["feasible"], unplaceable_periods=solver.feasibility["unplaceable_periods"])
+        if not (solver.feasibility["feasible"] or args.allow_infeasible):
+            print("The demand cannot be met; see feasibility, or pass --allow-infeasible.", file=sys.stderr)
+            print(json.dumps({**summary, "feasibility": solver.feasibility}))
+            return 1
+        timetable = solver.solve(on_progress=_print_progress if args.progress else None, **solve_options)
+        best_score, stop_reason = solver.best_timetable_score, solver.stop_reason
+        if not timetable:
+            print("Failed to generate a timetable.", file=sys.stderr)
+            return 1
+        if cache and cacheable(args.seed, args.target_score, best_score, args.time_budget, stop_reason): cache.put(fingerprint, timetable, best_score, stop_reason)
+    solved = time.perf_counter()
+    summary.update(solve_s=solved - loaded, best_score=best_score, stop_reason=stop_reason, entries=len(timetable))
+
+    if args.publish: summary["version_id"] = _publish(engine, timetable, best_score)
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            for chunk in stream_export(timetable, TimetableIndex(timetable, summary.get("version_id")), fmt, args.by,
+                                       term_start=args.term_start, weeks=args.weeks):
+                f.write(chunk)
+        summary["output"] = args.output
+    summary["write_s"] = time.perf_counter() - solved
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
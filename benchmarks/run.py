@@ -0,0 +1,189 @@
+"""
+Benchmarks the solver and the API read paths on a seeded synthetic dataset and prints
+the results as JSON, so runs can be compared across commits:
+
+    python -m benchmarks.run --preset medium --output bench.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from solver import AntColonyTimetableSolver
+from benchmarks.synthetic import PRESETS, generate_dataset
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _latency_stats(samples):
+    samples = sorted(samples)
+    return {"count": len(samples), "mean_ms": statistics.fmean(samples) * 1000,
+            "p50_ms": samples[len(samples) // 2] * 1000, "p95_ms": samples[int(len(samples) * 0.95)] * 1000}
+
+
+def bench_solver(dataset, iterations, seed):
+    """Setup time, ants/sec and evaluation time over a fixed number of iterations, then peak memory."""
+    started = time.perf_counter()
+    solver = AntColonyTimetableSolver(*dataset.solver_args(), seed=seed)
+    setup = time.perf_counter() - started
+    construct_time = evaluate_time = 0.0
+    for i in range(iterations):
+        started = time.perf_counter()
+        timetables = solver._construct_ants(i)
+        construct_time += time.perf_counter() - started
+        started = time.perf_counter()
+        solver._check_clashes_batch(timetables)
+        evaluate_time += time.perf_counter() - started
+        solver._update_pheromones(timetables)
+    ants = iterations * solver.num_ants
+    results = {"setup_s": setup, "blocks": len(solver.scheduling_blocks), "iterations": iterations,
+               "ants_per_s": ants / construct_time if construct_time else None,
+               "evaluation_us_per_ant": evaluate_time / ants * 1e6 if ants else None,
+               "best_score": solver.best_timetable_score}
+
+    # tracemalloc slows allocation-heavy code a lot, so memory is measured on a separate run.
+    tracemalloc.start()
+    solver = AntColonyTimetableSolver(*dataset.solver_args(), seed=seed)
+    solver._update_pheromones(solver._construct_ants(0))
+    results["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return results
+
+
+def bench_convergence(dataset, seed, time_budget):
+    """Runs solve() towards a clash-free timetable and records how many iterations it took."""
+    progress = []
+    solver = AntColonyTimetableSolver(*dataset.solver_args(), seed=seed)
+    started = time.perf_counter()
+    solver.solve(time_budget=time_budget, target_score=0, on_progress=progress.append)
+    return {"elapsed_s": time.perf_counter() - started, "iterations_run": len(progress), "best_score": solver.best_timetable_score,
+            "stop_reason": solver.stop_reason, "components": solver.metrics.counters.get("components", 1), "phase_seconds": solver.metrics.phase_seconds,
+            "failed_placements": solver.metrics.failed_placements,
+            "iterations_to_zero_clash": len(progress) if solver.best_timetable_score == 0 else None}
+
+
+def bench_incremental(dataset, seed, time_budget, patience=10):
+    """Solves once, moves one student to another elective, then times a warm-started re-solve."""
+    solver = AntColonyTimetableSolver(*dataset.solver_args(), seed=seed)
+    previous = solver.solve(time_budget=time_budget)
+    choice = dataset.elective_choices[0]
+    chosen = {e.course_id for e in dataset.elective_choices if e.student_id == choice.student_id}
+    current = next(c for c in dataset.courses if c.id == choice.course_id)
+    course = next(c for c in dataset.courses if c.course_type != "Major" and c.id not in chosen
+                  and (c.program_name, c.semester) == (current.program_name, current.semester))
+    original, choice.course_id = choice.course_id, course.id
+    try:
+        started = time.perf_counter()
+        solver = AntColonyTimetableSolver(*dataset.solver_args(), seed=seed)
+        replaced = solver.warm_start(previous)
+        solver.solve(patience=patience)
+        return {"elapsed_s": time.perf_counter() - started, "replaced_groups": len(replaced),
+                "fixed_entries": len(solver.fixed_entries), "iterations_run": solver.metrics.counters["iterations"],
+                "best_score": solver.best_timetable_score, "fixed_score": solver.fixed_score}
+    finally:
+        choice.course_id = original
+
+
+def bench_api(dataset, requests, time_budget, seed):
+    """Publishes a timetable through the API on a scratch database, then times the read endpoints."""
+    scratch = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ["SOLVER_CACHE_DIR"] = os.path.join(scratch, "solver_cache")
+    import app as app_module
+    with app_module.Session() as db_session:
+        dataset.save(db_session)
+    client = app_module.app.test_client()
+    job, elapsed = _generate(client, {"time_budget": time_budget})
+    results = {"generate_s": elapsed, "generate_status": job["status"]}
+    if job["status"] != "succeeded": return results
+    # Unchanged data and options: served from the solver result cache.
+    job, elapsed = _generate(client, {"time_budget": time_budget})
+    results.update(regenerate_s=elapsed, regenerate_cached=job["cached"])
+
+    rng = random.Random(seed)
+    for kind, ids in (("student", [s.id for s in dataset.students]), ("teacher", [t.id for t in dataset.teachers])):
+        sample = [rng.choice(ids) for _ in range(requests)]
+        cold, warm, revalidate = [], [], []
+        for person_id in sample:
+            url = f"/api/{kind}/timetable?{kind}_id={person_id}"
+            for samples, headers in ((cold, None), (warm, None)):
+                started = time.perf_counter()
+                response = client.get(url, headers=headers)
+                samples.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            client.get(url, headers={"If-None-Match": response.headers.get("ETag", "")})
+            revalidate.append(time.perf_counter() - started)
+        results[kind] = {"first": _latency_stats(cold), "repeat": _latency_stats(warm), "revalidate_304": _latency_stats(revalidate)}
+    results["export"] = {fmt: bench_export(client, f"/api/admin/export/timetable?format={fmt}&by=student") for fmt in ("csv", "jsonl", "ics")}
+    return results
+
+
+def _generate(client, options):
+    """Submits a generation job and polls it to completion; returns the final job and seconds taken."""
+    started = time.perf_counter()
+    job = client.post("/api/admin/generate-timetable", json=options).get_json()
+    while job["status"] in ("queued", "running"):
+        time.sleep(0.05)
+        job = client.get(f"/api/admin/jobs/{job['job_id']}").get_json()
+    return job, time.perf_counter() - started
+
+
+def bench_export(client, url):
+    """Streams one bulk export without buffering it, then again under tracemalloc for its peak memory."""
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in client.get(url, buffered=False).iter_encoded())
+    results = {"elapsed_s": time.perf_counter() - started, "size_mb": size / 2 ** 20}
+    tracemalloc.start()
+    for _chunk in client.get(url, buffered=False).iter_encoded(): pass
+    results["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cross-program-teaching", type=float, default=1.0,
+                        help="share of teachers who may teach outside their program; lower values give independent components")
+    parser.add_argument("--iterations", type=int, default=5, help="iterations timed for ants/sec and evaluation")
+    parser.add_argument("--time-budget", type=float, default=30.0, help="seconds allowed for the convergence and API solves")
+    parser.add_argument("--requests", type=int, default=200, help="sampled requests per API endpoint")
+    parser.add_argument("--skip", action="append", default=[], choices=["solver", "convergence", "incremental", "api"])
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    dataset = generate_dataset(args.preset, seed=args.seed, cross_program_teaching=args.cross_program_teaching)
+    results = {"commit": _git_commit(), "python": platform.python_version(), "timestamp": time.time(),
+               "preset": args.preset, "config": dataset.config, "dataset": dataset.summary(),
+               "generate_dataset_s": time.perf_counter() - started}
+    # Keep stdout clean for the JSON report; anything the app or solver prints goes to stderr.
+    with contextlib.redirect_stdout(sys.stderr):
+        if "solver" not in args.skip: results["solver"] = bench_solver(dataset, args.iterations, args.seed)
+        if "convergence" not in args.skip: results["convergence"] = bench_convergence(dataset, args.seed, args.time_budget)
+        if "incremental" not in args.skip: results["incremental"] = bench_incremental(dataset, args.seed, args.time_budget)
+        if "api" not in args.skip: results["api"] = bench_api(dataset, args.requests, args.time_budget, args.seed)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f: f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
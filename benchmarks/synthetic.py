@@ -0,0 +1,88 @@
+import random
+
+from models import Teacher, Student, Course, Classroom, StudentElective
+
+# --- Dataset presets, from a small college up to ~20k students ---
+PRESETS = {
+    "small":  {"programs": 2,  "semesters": [1, 3],       "sections": 2, "students_per_section": 30,  "cores": 4, "electives": 3},
+    "medium": {"programs": 6,  "semesters": [1, 3, 5, 7], "sections": 3, "students_per_section": 50,  "cores": 5, "electives": 4},
+    "large":  {"programs": 10, "semesters": [1, 3, 5, 7], "sections": 5, "students_per_section": 100, "cores": 6, "electives": 6},
+}
+# cross_program_teaching: share of teachers whose second preference may be a course of any
+# program rather than their own; below 1 the college splits into more independent parts.
+DEFAULTS = {"electives_per_student": 2, "teachers_per_course": 2, "room_ratio": 1.5, "cross_program_teaching": 1.0, "seed": 0}
+ELECTIVE_TYPES = ["Minor", "Skill-Based", "Ability Enhancement", "Value-Added"]
+CONSTRAINTS = {"working_days": 5, "periods_per_day": 8, "minimum_total_credits": 120}
+
+
+class SyntheticDataset:
+    """Transient model instances for one generated college, in the solver's argument order."""
+    def __init__(self, config, courses, teachers, students, classrooms, elective_choices):
+        self.config = config
+        self.courses = courses
+        self.teachers = teachers
+        self.students = students
+        self.classrooms = classrooms
+        self.feedback = []
+        self.elective_choices = elective_choices
+        self.constraints = dict(CONSTRAINTS)
+
+    def solver_args(self):
+        return (self.courses, self.teachers, self.students, self.classrooms, self.feedback, self.elective_choices, self.constraints)
+
+    def summary(self):
+        return {"students": len(self.students), "courses": len(self.courses), "teachers": len(self.teachers),
+                "classrooms": len(self.classrooms), "elective_choices": len(self.elective_choices)}
+
+    def save(self, db_session):
+        """Inserts the dataset as plain rows, leaving the generated instances detached."""
+        for model, items in ((Course, self.courses), (Teacher, self.teachers), (Student, self.students),
+                             (Classroom, self.classrooms), (StudentElective, self.elective_choices)):
+            columns = [c.name for c in model.__table__.columns]
+            db_session.execute(model.__table__.insert(), [{name: getattr(item, name) for name in columns} for item in items])
+        db_session.commit()
+
+
+def generate_dataset(preset="small", **overrides):
+    """Builds a seeded synthetic dataset from a preset, with any config key overridable."""
+    config = {**DEFAULTS, **PRESETS[preset], **overrides}
+    rng = random.Random(config["seed"])
+    courses, teachers, students, classrooms, elective_choices = [], [], [], [], []
+    electives_by_cohort = {}
+    programs = [f"PRG{p}" for p in range(config["programs"])]
+    for program in programs:
+        for semester in config["semesters"]:
+            for k in range(config["cores"]):
+                courses.append(Course(id=len(courses) + 1, program_name=program, semester=semester, course_name=f"{program} S{semester} Core {k + 1}",
+                                      credits=rng.choice([3, 4]), course_type="Major", is_lab=rng.choice(["Theory", "Lab"]), style="heavy-theory"))
+            electives = []
+            for k in range(config["electives"]):
+                electives.append(Course(id=len(courses) + 1, program_name=program, semester=semester, course_name=f"{program} S{semester} Elective {k + 1}",
+                                        credits=rng.choice([2, 3]), course_type=rng.choice(ELECTIVE_TYPES), is_lab="Theory", style="hands-on"))
+                courses.append(electives[-1])
+            electives_by_cohort[(program, semester)] = electives
+
+    course_names = [c.course_name for c in courses]
+    program_course_names = {program: [c.course_name for c in courses if c.program_name == program] for program in programs}
+    for course in courses:
+        for _ in range(config["teachers_per_course"]):
+            cross_program = config["cross_program_teaching"] >= 1 or rng.random() < config["cross_program_teaching"]
+            teachers.append(Teacher(id=f"T-{len(teachers) + 1:05d}", working_hours=rng.randint(16, 22), first_preference=course.course_name,
+                                    second_preference=rng.choice(course_names if cross_program else program_course_names[course.program_name])))
+
+    for program in programs:
+        for semester in config["semesters"]:
+            electives = electives_by_cohort[(program, semester)]
+            for section in range(config["sections"]):
+                for _ in range(config["students_per_section"]):
+                    student = Student(id=f"S-{len(students) + 1:06d}", name=f"Student {len(students) + 1}",
+                                      program=program, semester=semester, section=chr(ord("A") + section))
+                    students.append(student)
+                    for course in rng.sample(electives, min(config["electives_per_student"], len(electives))):
+                        elective_choices.append(StudentElective(id=len(elective_choices) + 1, student_id=student.id, course_id=course.id))
+
+    num_sections = config["programs"] * len(config["semesters"]) * config["sections"]
+    capacities = [config["students_per_section"] // 2, config["students_per_section"], int(config["students_per_section"] * 1.5), config["students_per_section"] * 3]
+    for r in range(max(1, int(num_sections * config["room_ratio"]))):
+        classrooms.append(Classroom(id=r + 1, location=f"Room {r + 101}", capacity=rng.choice(capacities)))
+    return SyntheticDataset(config, courses, teachers, students, classrooms, elective_choices)
@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from timetable_index import DAYS
+
+# --- Constants ---
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'ics': 'text/calendar'}
+EXPORT_GROUPINGS = ('student', 'teacher', 'room', 'group')
+ENTRY_FIELDS = ('day', 'period', 'slot', 'course_id', 'course_name', 'teacher_id', 'room_id', 'room_name', 'group', 'cohort')
+# Output is yielded in chunks of about this many characters rather than one per person.
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Calendar exports: periods run back to back from FIRST_PERIOD_START, weekly for TERM_WEEKS weeks.
+FIRST_PERIOD_START = (9, 0)
+PERIOD_MINUTES = 60
+TERM_WEEKS = 16
+
+
+def export_groups(timetable, index, by):
+    """
+    Yields (key, rows) for every student, teacher, room or group with classes, keys in
+    sorted order and rows in slot order. Students and teachers come from the
+    TimetableIndex; rooms and groups are bucketed from the timetable's columns.
+    """
+    if by == 'student':
+        keys, rows_for = sorted(index.student_cohorts), index.student_rows
+    elif by == 'teacher':
+        keys, rows_for = sorted(t for t, rows in list(index.rows_by_teacher.items()) if rows), index.teacher_rows
+    else:
+        buckets = defaultdict(list)
+        for row in timetable.active_rows():
+            buckets[timetable.rooms[timetable.room[row]].id if by == 'room' else timetable.group(row)].append(row)
+        keys, rows_for = sorted(buckets), buckets.__getitem__
+    slot_order = [_slot_order(slot) for slot in timetable.slots]
+    for key in keys:
+        rows = sorted(rows_for(key), key=lambda row: slot_order[timetable.slot[row]])
+        if rows: yield key, rows
+
+
+def stream_export(timetable, index, fmt, by, term_start=None, weeks=TERM_WEEKS):
+    """Generates the export body in chunks of csv lines, jsonl objects or one VCALENDAR per key."""
+    # Each row is rendered once; every key's block is joined from those fragments, so memory stays flat in the number of people.
+    rows = timetable.active_rows()
+    if fmt == 'csv':
+        fragments = {row: _csv_line(_entry_fields(timetable, row)) for row in rows}
+        def pieces():
+            yield _csv_line(('key',) + ENTRY_FIELDS)
+            for key, key_rows in export_groups(timetable, index, by):
+                key_cell = _csv_line((key,))[:-2]
+                yield ''.join(f"{key_cell},{fragments[row]}" for row in key_rows)
+        return _chunked(pieces())
+    if fmt == 'jsonl':
+        fragments = {row: json.dumps(dict(zip(ENTRY_FIELDS, _entry_fields(timetable, row)))) for row in rows}
+        pieces = (f'{{"key": {json.dumps(key)}, "entries": [{", ".join(fragments[row] for row in key_rows)}]}}\n'
+                  for key, key_rows in export_groups(timetable, index, by))
+        return _chunked(pieces)
+    term_start = term_start or date.today()
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    fragments = {row: _ical_event(timetable, row, term_start, stamp, weeks) for row in rows}
+    calendar_start = _ical_line('BEGIN', 'VCALENDAR') + _ical_line('VERSION', '2.0') + _ical_line('PRODID', '-//timetable_project//export//EN')
+    event_start = _ical_line('BEGIN', 'VEVENT')
+    pieces = (''.join((calendar_start, _ical_line('X-WR-CALNAME', _ical_text(str(key))),
+                       # UIDs use the entry ids, or row positions for a timetable that has not been saved.
+                       *(event_start + _ical_line('UID', f"{timetable.entry_id[row] or f'row{row}'}-{key}@timetable") + fragments[row] for row in key_rows),
+                       _ical_line('END', 'VCALENDAR')))
+              for key, key_rows in export_groups(timetable, index, by))
+    return _chunked(pieces)
+
+
+def _entry_fields(timetable, row):
+    slot = timetable.slots[timetable.slot[row]]
+    day, period = slot.split('_')
+    course, room = timetable.courses[timetable.course[row]], timetable.rooms[timetable.room[row]]
+    return (day, int(period), slot, course.id, course.course_name, timetable.teacher_id(row), room.id, room.location,
+            timetable.group(row), timetable.cohort_keys[timetable.cohort[row]])
+
+
+def _slot_order(slot):
+    day, period = slot.split('_')
+    return (DAYS.index(day) if day in DAYS else len(DAYS), int(period))
+
+
+def _chunked(pieces):
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer: yield ''.join(buffer)
+
+
+def _csv_line(values):
+    out = io.StringIO()
+    csv.writer(out).writerow(values)
+    return out.getvalue()
+
+
+# --- iCalendar (RFC 5545) ---
+def _ical_event(timetable, row, term_start, stamp, weeks):
+    """
+    The lines of one entry's VEVENT after its UID, which depends on the calendar it is
+    exported to. The first occurrence is the entry's day on or after term_start.
+    """
+    day, period, _slot, _course_id, course_name, teacher_id, _room_id, room_name, group, _cohort = _entry_fields(timetable, row)
+    first_day = term_start + timedelta(days=(DAYS.index(day) - term_start.weekday()) % 7)
+    start = datetime(first_day.year, first_day.month, first_day.day, *FIRST_PERIOD_START)
+    start += timedelta(minutes=PERIOD_MINUTES * (period - 1))
+    end = start + timedelta(minutes=PERIOD_MINUTES)
+    return ''.join((_ical_line('DTSTAMP', stamp), _ical_line('DTSTART', start.strftime('%Y%m%dT%H%M%S')),
+                    _ical_line('DTEND', end.strftime('%Y%m%dT%H%M%S')), _ical_line('RRULE', f'FREQ=WEEKLY;COUNT={weeks}'),
+                    _ical_line('SUMMARY', _ical_text(course_name)), _ical_line('LOCATION', _ical_text(room_name or '')),
+                    _ical_line('DESCRIPTION', _ical_text(f"Teacher {teacher_id}, group {group}")), _ical_line('END', 'VEVENT')))
+
+
+def _ical_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ical_line(name, value):
+    """A content line, folded at 75 octets without splitting a UTF-8 character."""
+    line = f"{name}:{value}"
+    encoded = line.encode()
+    if len(encoded) <= 75: return line + '\r\n'
+    parts, start = [], 0
+    while start < len(encoded):
+        end = min(start + (75 if not parts else 74), len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80: end -= 1
+        parts.append(encoded[start:end].decode())
+        start = end
+    return '\r\n '.join(parts) + '\r\n'
@@ -0,0 +1,225 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models import GenerationJobRecord
+
+# --- Constants ---
+JOB_WORKERS = 1
+MAX_FINISHED_JOBS = 20
+# Seconds between writes of an active job's progress, which also pick up cancellations from other workers.
+JOB_SYNC_INTERVAL = 1.0
+# An active job whose worker has not written for this long is taken to have stopped with it.
+JOB_STALE_AFTER = 60
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class GenerationJob:
+    """
+    One timetable generation run, tracked from enqueue to result. A job read back from the
+    database (see from_record) carries its stored state but no result or live metrics.
+    """
+    def __init__(self, dataset_version, options, job_id=None):
+        self.id = job_id or str(uuid.uuid4())
+        self.dataset_version = dataset_version
+        self.options = options
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.best_score = None
+        self.stop_reason = None
+        self.error = None
+        self.metrics = None
+        self.stored_metrics = None
+        self.feasibility = None
+        self.cached = False
+        self.version_id = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def update_progress(self, progress):
+        self.progress = progress
+
+    def should_stop(self):
+        return self.cancel_event.is_set()
+
+    def metrics_dict(self):
+        return self.metrics.to_dict() if self.metrics is not None else self.stored_metrics
+
+    def to_dict(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "dataset_version": self.dataset_version,
+            "status": self.status,
+            "iteration": self.progress.get("iteration"),
+            "iterations": self.progress.get("iterations"),
+            "best_score": self.best_score if self.best_score is not None else self.progress.get("best_score"),
+            "stop_reason": self.stop_reason,
+            "cached": self.cached,
+            "elapsed": elapsed,
+            "error": self.error,
+            "feasibility": self.feasibility,
+            "version_id": self.version_id,
+        }
+
+    def to_record(self):
+        """The generation_jobs columns this process owns, for writing the job's state."""
+        return {"status": self.status, "progress": self.progress, "best_score": self.best_score, "stop_reason": self.stop_reason,
+                "error": self.error, "feasibility": self.feasibility, "metrics": self.metrics_dict(), "cached": self.cached,
+                "version_id": self.version_id, "started_at": self.started_at, "finished_at": self.finished_at}
+
+    @classmethod
+    def from_record(cls, record):
+        job = cls(record.dataset_version, record.options or {}, record.id)
+        job.status, job.progress, job.best_score, job.stop_reason = record.status, record.progress or {}, record.best_score, record.stop_reason
+        job.error, job.feasibility, job.stored_metrics, job.cached = record.error, record.feasibility, record.metrics, bool(record.cached)
+        job.version_id, job.created_at, job.started_at, job.finished_at = record.version_id, record.created_at, record.started_at, record.finished_at
+        if record.cancel_requested: job.cancel_event.set()
+        return job
+
+
+class JobManager:
+    """Runs generation jobs in the background, keeping their state in the generation_jobs table that every app worker shares."""
+    def __init__(self, run_job, Session, max_workers=JOB_WORKERS):
+        self._run_job = run_job
+        self._Session = Session
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='timetable-job')
+        # Jobs submitted by this process, with their results and live metrics.
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._syncing = False
+
+    def submit(self, dataset_version, options):
+        """Returns (job, created); created is False when an active job for this version already exists."""
+        self._fail_stale()
+        job = GenerationJob(dataset_version, options)
+        try:
+            self._insert(job)
+        except IntegrityError:
+            # Another request, perhaps on another worker, queued one first.
+            active = self._find(GenerationJobRecord.dataset_version == dataset_version, GenerationJobRecord.status.in_(ACTIVE_STATES))
+            if active is not None: return active, False
+            self._insert(job)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            start_sync, self._syncing = not self._syncing, True
+        self._executor.submit(self._execute, job)
+        if start_sync: threading.Thread(target=self._sync_loop, name='timetable-job-sync', daemon=True).start()
+        return job, True
+
+    def get(self, job_id):
+        return self._jobs.get(job_id) or self._find(GenerationJobRecord.id == job_id)
+
+    def latest(self):
+        """The most recently submitted job, or None."""
+        return self._find()
+
+    def cancel(self, job_id):
+        """Flags the job for cancellation; a running solve stops after its current iteration."""
+        job, now = self._jobs.get(job_id), time.time()
+        if job is not None: job.cancel_event.set()
+        with self._Session() as db_session, db_session.begin():
+            record = GenerationJobRecord.id == job_id
+            if not db_session.execute(update(GenerationJobRecord).where(record).values(cancel_requested=True)).rowcount: return None
+            db_session.execute(update(GenerationJobRecord).where(record, GenerationJobRecord.status == QUEUED)
+                               .values(status=CANCELLED, finished_at=now))
+        if job is not None and job.status == QUEUED:
+            job.status, job.finished_at = CANCELLED, now
+        return self.get(job_id)
+
+    def _execute(self, job):
+        if job.should_stop() or not self._claim(job):
+            if job.status == QUEUED: job.status, job.finished_at = CANCELLED, time.time()
+            return
+        try:
+            job.result = self._run_job(job)
+            job.status = CANCELLED if job.should_stop() else SUCCEEDED
+        except Exception as e:
+            job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished_at = time.time()
+            self._write(job)
+
+    # --- generation_jobs rows ---
+    def _insert(self, job):
+        with self._Session() as db_session, db_session.begin():
+            db_session.add(GenerationJobRecord(id=job.id, dataset_version=job.dataset_version, options=job.options,
+                                               created_at=job.created_at, heartbeat_at=job.created_at, **job.to_record()))
+            finished = GenerationJobRecord.status.not_in(ACTIVE_STATES)
+            kept = (select(GenerationJobRecord.id).where(finished).order_by(GenerationJobRecord.created_at.desc())
+                    .limit(MAX_FINISHED_JOBS).scalar_subquery())
+            db_session.execute(delete(GenerationJobRecord).where(finished, GenerationJobRecord.id.not_in(kept)))
+
+    def _find(self, *conditions):
+        """The newest job matching conditions, this process's own object if it runs here."""
+        with self._Session() as db_session:
+            record = db_session.execute(select(GenerationJobRecord).where(*conditions)
+                                        .order_by(GenerationJobRecord.created_at.desc()).limit(1)).scalar()
+            if record is None: return None
+            return self._jobs.get(record.id) or GenerationJob.from_record(record)
+
+    def _claim(self, job):
+        """Marks a queued job running, unless it was cancelled (possibly by another worker) meanwhile."""
+        now = time.time()
+        with self._Session() as db_session, db_session.begin():
+            claimed = db_session.execute(update(GenerationJobRecord)
+                                         .where(GenerationJobRecord.id == job.id, GenerationJobRecord.status == QUEUED,
+                                                GenerationJobRecord.cancel_requested.is_not(True))
+                                         .values(status=RUNNING, started_at=now, heartbeat_at=now)).rowcount
+        if claimed: job.status, job.started_at = RUNNING, now
+        return bool(claimed)
+
+    def _write(self, job):
+        with self._Session() as db_session, db_session.begin():
+            db_session.execute(update(GenerationJobRecord).where(GenerationJobRecord.id == job.id)
+                               .values(heartbeat_at=time.time(), **job.to_record()))
+
+    def _fail_stale(self):
+        """Fails active jobs whose worker stopped writing (e.g. it was restarted), so they no longer hold their version."""
+        now = time.time()
+        with self._Session() as db_session, db_session.begin():
+            db_session.execute(update(GenerationJobRecord)
+                               .where(GenerationJobRecord.status.in_(ACTIVE_STATES), GenerationJobRecord.heartbeat_at < now - JOB_STALE_AFTER)
+                               .values(status=FAILED, error="The worker running this job stopped.", finished_at=now))
+
+    def _sync_loop(self):
+        """Writes the progress of this process's active jobs and picks up their cancellations, until none is left."""
+        while True:
+            time.sleep(JOB_SYNC_INTERVAL)
+            with self._lock:
+                active = [job for job in self._jobs.values() if job.status in ACTIVE_STATES]
+                if not active:
+                    self._syncing = False
+                    return
+            try: self._sync(active)
+            except SQLAlchemyError: pass  # e.g. the database is locked; the next round writes again
+
+    def _sync(self, jobs):
+        # Metrics are written when a job finishes: the solver mutates them while it runs.
+        now = time.time()
+        with self._Session() as db_session, db_session.begin():
+            for job in jobs:
+                db_session.execute(update(GenerationJobRecord)
+                                   .where(GenerationJobRecord.id == job.id, GenerationJobRecord.status.in_(ACTIVE_STATES))
+                                   .values(progress=job.progress, best_score=job.best_score, feasibility=job.feasibility,
+                                           cached=job.cached, heartbeat_at=now))
+            cancelled = set(db_session.execute(select(GenerationJobRecord.id).where(
+                GenerationJobRecord.id.in_([job.id for job in jobs]), GenerationJobRecord.cancel_requested.is_(True))).scalars())
+        for job in jobs:
+            if job.id in cancelled: job.cancel_event.set()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.status not in ACTIVE_STATES]
+        for job in sorted(finished, key=lambda j: j.created_at)[:-MAX_FINISHED_JOBS or None]:
+            del self._jobs[job.id]
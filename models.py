@@ -1,8 +1,15 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey
+from sqlalchemy import (create_engine, event, insert, inspect, select, text, update, Boolean, Column, Index, Integer, JSON,
+                        String, Float, ForeignKey)
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
 
+# --- SQLite connection settings ---
+SQLITE_POOL_SIZE = 5
+SQLITE_MAX_OVERFLOW = 10
+SQLITE_BUSY_TIMEOUT = 30  # seconds a connection waits for another writer's lock
+
 # --- Existing Tables ---
 class Teacher(Base):
     __tablename__ = 'teachers'
@@ -55,6 +62,14 @@ class StudentElective(Base):
     student_id = Column(String, ForeignKey('students.id'), nullable=False)
     course_id = Column(Integer, ForeignKey('courses.id'), nullable=False)
 
+# --- Published timetables ---
+class TimetableVersion(Base):
+    __tablename__ = 'timetable_versions'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(Float, nullable=False)
+    best_score = Column(Float)
+    dataset_version = Column(Integer)
+
 class TimetableEntry(Base):
     __tablename__ = 'timetable_entries'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -62,6 +77,19 @@ class TimetableEntry(Base):
     teacher_id = Column(String, ForeignKey('teachers.id'), nullable=False)
     room_id = Column(Integer, ForeignKey('classrooms.id'), nullable=False)
     slot = Column(String, nullable=False)
+    # --- NEW FIELDS: columns added after the original schema must stay nullable (see upgrade_schema) ---
+    version_id = Column(Integer, ForeignKey('timetable_versions.id'), index=True)
+    group_name = Column(String)
+    cohort = Column(String)
+    status = Column(String, server_default='active')
+
+class TimetableCohortMember(Base):
+    """Students of one cohort (a whole group, or a group's students in one elective) of a version."""
+    __tablename__ = 'timetable_cohort_members'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    version_id = Column(Integer, ForeignKey('timetable_versions.id'), nullable=False, index=True)
+    cohort = Column(String, nullable=False)
+    student_id = Column(String, ForeignKey('students.id'), nullable=False)
 
 class TimetableStudentLink(Base):
     __tablename__ = 'timetable_student_link'
@@ -83,3 +111,97 @@ class SubstitutionOffer(Base):
     offered_to_teacher_id = Column(String, ForeignKey('teachers.id'), nullable=False)
     status = Column(String, default='offered')
 
+class TimetableChange(Base):
+    """A write to the published timetable's requests, offers or entries, keyed by the timetable data version it produced."""
+    __tablename__ = 'timetable_changes'
+    data_version = Column(Integer, primary_key=True, autoincrement=False)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON)
+
+# --- Generation jobs, shared by every app worker (see jobs.JobManager) ---
+class GenerationJobRecord(Base):
+    __tablename__ = 'generation_jobs'
+    id = Column(String, primary_key=True)
+    dataset_version = Column(Integer)
+    options = Column(JSON)
+    status = Column(String, nullable=False)
+    progress = Column(JSON)
+    best_score = Column(Float)
+    stop_reason = Column(String)
+    error = Column(String)
+    feasibility = Column(JSON)
+    metrics = Column(JSON)
+    cached = Column(Boolean, default=False)
+    version_id = Column(Integer)
+    cancel_requested = Column(Boolean, default=False)
+    created_at = Column(Float, nullable=False)
+    started_at = Column(Float)
+    finished_at = Column(Float)
+    heartbeat_at = Column(Float)
+    # At most one queued or running job per dataset version, whichever worker submits it.
+    __table_args__ = (Index('ix_generation_jobs_active_version', 'dataset_version', unique=True,
+                            sqlite_where=text("status IN ('queued', 'running')"),
+                            postgresql_where=text("status IN ('queued', 'running')")),)
+
+# --- Change counters shared by every process using the database ---
+REFERENCE_DATA_VERSION = 'reference'
+TIMETABLE_DATA_VERSION = 'timetable'
+
+class DataVersion(Base):
+    """One row per cached dataset, bumped by every write to it in the write's own transaction."""
+    __tablename__ = 'data_versions'
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
+
+def read_data_version(connection, name):
+    """The dataset's current version (0 before its first change); connection may also be a Session."""
+    return connection.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+
+def bump_data_version(connection, name, expected=None):
+    """
+    Moves the dataset's version on by one inside the caller's transaction and returns it.
+    With expected, only moves it from that version and returns None if it has moved since.
+    """
+    condition = DataVersion.name == name
+    if expected is not None: condition &= DataVersion.version == expected
+    bumped = connection.execute(update(DataVersion).where(condition).values(version=DataVersion.version + 1)
+                                .returning(DataVersion.version)).scalar()
+    if bumped is not None or expected not in (None, 0): return bumped
+    if read_data_version(connection, name): return None
+    connection.execute(insert(DataVersion).values(name=name, version=1))
+    return 1
+
+def upgrade_schema(engine):
+    """Adds columns introduced after a table was first created, since create_all never alters tables."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name): continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing: continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None: ddl += f" DEFAULT '{column.server_default.arg}'"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def create_db_engine(database_url):
+    """
+    Creates the engine. SQLite files get a sized connection pool, and every new connection
+    is switched to the WAL journal that lib/db.js also uses, with synchronous=NORMAL, so
+    readers never block the writer and concurrent writers wait for the lock instead of failing.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() != 'sqlite': return create_engine(database_url, pool_pre_ping=True)
+    if url.database in (None, '', ':memory:'): return create_engine(database_url)
+    engine = create_engine(database_url, pool_size=SQLITE_POOL_SIZE, max_overflow=SQLITE_MAX_OVERFLOW,
+                           connect_args={'timeout': SQLITE_BUSY_TIMEOUT, 'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+    return engine
@@ -0,0 +1,47 @@
+import threading
+from sqlalchemy import select
+
+from models import (Teacher, Student, Course, Classroom, Feedback, StudentElective, REFERENCE_DATA_VERSION,
+                    bump_data_version, read_data_version)
+from reference_data import RECORD_TYPES, ReferenceData
+
+REFERENCE_MODELS = {'teachers': Teacher, 'students': Student, 'courses': Course, 'classrooms': Classroom,
+                    'feedback': Feedback, 'elective_choices': StudentElective}
+
+
+class ReferenceCache:
+    """
+    Serves ReferenceData from memory. Writers call invalidate(connection) inside the
+    transaction that changes the tables, which bumps the reference data version stored in
+    the database; get() compares it with the cached snapshot's (a single-row read), so
+    every process reloads after a change made by any of them.
+    """
+    def __init__(self, Session):
+        self._Session = Session
+        self._lock = threading.Lock()
+        self._data = None
+
+    @property
+    def version(self):
+        with self._Session() as db_session:
+            return read_data_version(db_session, REFERENCE_DATA_VERSION)
+
+    def invalidate(self, connection):
+        """Bumps the version in the writer's transaction; connection may also be a Session."""
+        bump_data_version(connection, REFERENCE_DATA_VERSION)
+
+    def get(self):
+        data, version = self._data, self.version
+        if data is not None and data.version == version: return data
+        with self._lock:
+            if self._data is None or self._data.version != version:
+                self._data = self._load()
+            return self._data
+
+    def _load(self):
+        with self._Session() as db_session:
+            # The version is read first: a change committed meanwhile only makes the next get() reload again.
+            version = read_data_version(db_session, REFERENCE_DATA_VERSION)
+            tables = {name: tuple(RECORD_TYPES[name](*row) for row in db_session.execute(select(model.__table__)))
+                      for name, model in REFERENCE_MODELS.items()}
+        return ReferenceData(version, tables)
@@ -0,0 +1,85 @@
+import csv
+import hashlib
+import json
+import os
+from collections import defaultdict, namedtuple
+
+# --- Immutable records with the same fields as the reference tables' columns ---
+# Spelled out rather than read from models, so CSV datasets load without SQLAlchemy;
+# tests check them against the models.
+REFERENCE_COLUMNS = {
+    'teachers': (('id', str), ('working_hours', int), ('first_preference', str), ('second_preference', str)),
+    'students': (('id', str), ('name', str), ('program', str), ('semester', int), ('section', str)),
+    'courses': (('id', int), ('program_name', str), ('semester', int), ('course_name', str), ('credits', int),
+                ('course_type', str), ('is_lab', str), ('style', str)),
+    'classrooms': (('id', int), ('location', str), ('capacity', int)),
+    'feedback': (('id', int), ('student_id', str), ('teacher_id', str), ('course_id', int), ('teacher_rating', float),
+                 ('course_rating', float)),
+    'elective_choices': (('id', int), ('student_id', str), ('course_id', int)),
+}
+RECORD_TYPES = {name: namedtuple(f"{name.title().replace('_', '')}Record", [column for column, _convert in columns])
+                for name, columns in REFERENCE_COLUMNS.items()}
+# File names of the tables in a CSV dataset, as uploaded through the admin API.
+CSV_FILES = {'teachers': 'teachers.csv', 'students': 'students.csv', 'courses': 'courses.csv', 'classrooms': 'classrooms.csv',
+             'feedback': 'feedback.csv', 'elective_choices': 'student_electives.csv'}
+OPTIONAL_CSV_TABLES = ('feedback', 'elective_choices')
+
+
+class ReferenceData:
+    """
+    A consistent snapshot of the reference tables as tuples of records, with the lookups
+    request handlers need. Shared between threads, so it is never mutated (apart from
+    caching its fingerprint); records carry the model attribute names and can be handed
+    to the solver in place of ORM objects.
+    """
+    def __init__(self, version, tables):
+        self.version = version
+        self.teachers, self.students, self.courses = tables['teachers'], tables['students'], tables['courses']
+        self.classrooms, self.feedback, self.elective_choices = tables['classrooms'], tables['feedback'], tables['elective_choices']
+        self.counts = {name: len(rows) for name, rows in tables.items()}
+        self.teachers_by_id = {t.id: t for t in self.teachers}
+        self.courses_by_id = {c.id: c for c in self.courses}
+        self.classrooms_by_id = {r.id: r for r in self.classrooms}
+        electives_by_student = defaultdict(list)
+        for choice in self.elective_choices: electives_by_student[choice.student_id].append(choice.course_id)
+        self.electives_by_student = {student_id: tuple(course_ids) for student_id, course_ids in electives_by_student.items()}
+        self._fingerprint = None
+
+    def fingerprint(self):
+        """SHA-256 of every table's contents, independent of row order; computed on first use."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for name in REFERENCE_COLUMNS:
+                digest.update(f"{name}\n".encode())
+                for line in sorted(json.dumps(row, default=str) for row in getattr(self, name)):
+                    digest.update(f"{line}\n".encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def solver_args(self):
+        """Courses, teachers, students, classrooms, feedback and elective choices, in the solver's argument order."""
+        return self.courses, self.teachers, self.students, self.classrooms, self.feedback, self.elective_choices
+
+
+def load_csv_dataset(directory, version=0):
+    """
+    ReferenceData read from the CSV files in a directory with the standard csv module, so
+    neither pandas nor a database is needed. Values are converted by their column's type
+    and blanks become None; feedback and elective choices may be missing.
+    """
+    tables = {}
+    for name, converters in REFERENCE_COLUMNS.items():
+        path = os.path.join(directory, CSV_FILES[name])
+        if not os.path.exists(path) and name in OPTIONAL_CSV_TABLES:
+            tables[name] = ()
+            continue
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            tables[name] = tuple(RECORD_TYPES[name](*(_csv_value(row.get(column), convert) for column, convert in converters))
+                                 for row in csv.DictReader(f))
+    return ReferenceData(version, tables)
+
+
+def _csv_value(value, convert):
+    if value is None or value.strip() == '': return None
+    if convert is int: return int(float(value))
+    return convert(value)
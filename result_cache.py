@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from timetable import Timetable
+
+# --- Constants ---
+RESULT_CACHE_SIZE = 20
+# Bump when the solver, the stored layout or what is stored changes, so older results stop matching.
+RESULT_CACHE_FORMAT = 3
+
+
+def solver_fingerprint(reference, constraints, options):
+    """
+    Content address of a solve: the reference data's fingerprint, the constraints and the
+    options that shape the result (time_budget, target_score, patience,
+    local_search_passes, seed, allow_infeasible). Requests without a seed share one
+    address per input, so only their results that reached the target are stored (see
+    cacheable).
+    """
+    key = {"format": RESULT_CACHE_FORMAT, "data": reference.fingerprint(), "constraints": constraints, "options": options}
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cacheable(seed, target_score, best_score, time_budget=None, stop_reason=None):
+    """
+    Whether a result may be stored: a seeded solve is reproducible unless time_budget
+    stopped it, since how far it got depends on the machine; any other result is kept only
+    if it reached target_score, so an unlucky run is solved again instead of republished.
+    """
+    if seed is not None and (time_budget is None or stop_reason != 'time_budget'): return True
+    return target_score is not None and best_score <= target_score
+
+
+class ResultCache:
+    """
+    Disk-backed store of solved timetables keyed by solver_fingerprint, one gzipped JSON
+    file per result. The directory is created by the first write. Reading a result touches
+    its file, and writing evicts the least recently used files beyond max_entries. Rows are
+    stored by course, teacher and room id, so a hit is rebuilt against the current
+    reference data.
+    """
+    def __init__(self, directory, max_entries=RESULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, f"{fingerprint}.json.gz")
+
+    def get(self, fingerprint, reference):
+        """Returns (timetable, best_score, stop_reason) for a stored result, or None."""
+        path = self._path(fingerprint)
+        try:
+            with gzip.open(path, 'rt') as f: payload = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        timetable = _timetable_from_payload(payload, reference)
+        if timetable is None: return None
+        return timetable, payload['best_score'], payload['stop_reason']
+
+    def put(self, fingerprint, timetable, best_score, stop_reason):
+        payload = _timetable_payload(timetable)
+        payload.update(best_score=best_score, stop_reason=stop_reason)
+        os.makedirs(self.directory, exist_ok=True)
+        # Written to a temporary file and renamed, so readers never see a partial result.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt') as f: json.dump(payload, f)
+            os.replace(tmp_path, self._path(fingerprint))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        with self._lock: self._evict()
+
+    def _evict(self):
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json.gz')]
+        if len(paths) <= self.max_entries: return
+        paths.sort(key=lambda path: os.stat(path).st_mtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            try: os.remove(path)
+            except OSError: pass
+
+
+def _timetable_payload(timetable):
+    rows = timetable.active_rows()
+    return {"course": [timetable.courses[timetable.course[row]].id for row in rows],
+            "teacher": [timetable.teacher_id(row) for row in rows],
+            "room": [timetable.rooms[timetable.room[row]].id for row in rows],
+            "slot": [timetable.slots[timetable.slot[row]] for row in rows],
+            "cohort": [timetable.cohort[row] for row in rows],
+            "cohorts": [[key, group, list(students)] for key, group, students
+                        in zip(timetable.cohort_keys, timetable.cohort_groups, timetable.cohort_students)]}
+
+
+def _timetable_from_payload(payload, reference):
+    """A Timetable over the reference data, or None if a stored id no longer exists."""
+    timetable = Timetable(reference.courses, reference.teachers, reference.classrooms)
+    cohorts = [timetable.add_cohort(key, group, students) for key, group, students in payload['cohorts']]
+    for course_id, teacher_id, room_id, slot, cohort in zip(payload['course'], payload['teacher'], payload['room'], payload['slot'], payload['cohort']):
+        c, t, r = timetable.course_index.get(course_id), timetable.teacher_index.get(teacher_id), timetable.room_index.get(room_id)
+        if c is None or t is None or r is None: return None
+        timetable.append(c, t, r, timetable.slot_position(slot), cohorts[cohort])
+    return timetable
@@ -1,21 +1,129 @@
+import copy
 import random
-from collections import defaultdict
+from itertools import accumulate
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import math
+import time
+import numpy as np
+
+from timetable import Timetable, cohort_key
 
 # --- Constants ---
 NUM_ANTS = 20
 NUM_ITERATIONS = 150 
 PHEROMONE_EVAPORATION_RATE = 0.1
 PHEROMONE_DEPOSIT_STRENGTH = 1.0
+# Floor of the trails (which start at 1.0), so no slot is ever ruled out (as in MAX-MIN ant systems).
+PHEROMONE_MIN = 0.05
+PHEROMONE_INFLUENCE = 1.0
 HEURISTIC_WEIGHT = 2.5
 HARD_PENALTY = 1000
+NUM_WORKERS = 1
+# Improvement passes of the local-search repair run on every ant; 0 disables it.
+LOCAL_SEARCH_PASSES = 3
+# Solve groups that share no eligible teachers as independent components.
+DECOMPOSE = True
+# Extra pheromone on a previous timetable's slots when warm-starting an incremental re-solve.
+WARM_START_DEPOSIT = 4.0
+# Constraints the app and the batch solver solve with.
+DEFAULT_CONSTRAINTS = {"working_days": 5, "periods_per_day": 8, "minimum_total_credits": 120}
+
+# --- Block kinds (scheduling blocks are stored as (kind, group_idx, course_idx) tuples) ---
+CORE_BLOCK = 0
+ELECTIVE_BLOCK = 1
+
+class SolverMetrics:
+    """Per-phase timings, placement counters and best-score history recorded during a solve."""
+    PHASES = ('block_creation', 'slot_assignment', 'resource_lookup', 'local_search', 'evaluation', 'pheromone_update')
+    FAILURE_REASONS = ('no_slot', 'no_teacher', 'no_room')
+
+    def __init__(self):
+        # CPU seconds summed over worker processes, so with several workers they can exceed the solve's wall-clock time.
+        self.phase_seconds = dict.fromkeys(self.PHASES, 0.0)
+        # Periods ant construction left unplaced (before repair), per reason, once per ant.
+        self.failed_placements = dict.fromkeys(self.FAILURE_REASONS, 0)
+        self.counters = defaultdict(int)
+        # (iteration, best score, elapsed) per colony iteration; a split solve records each component's under its number.
+        self.best_score_history = []
+        self.component_score_history = {}
+
+    def add_time(self, phase, seconds):
+        self.phase_seconds[phase] += seconds
+
+    def merge(self, other):
+        """Adds timings and counters recorded elsewhere, e.g. by a worker process."""
+        for phase, seconds in other.phase_seconds.items(): self.phase_seconds[phase] += seconds
+        for reason, count in other.failed_placements.items(): self.failed_placements[reason] += count
+        for name, count in other.counters.items(): self.counters[name] += count
+
+    def to_dict(self):
+        return {"phase_seconds": dict(self.phase_seconds), "failed_placements": dict(self.failed_placements),
+                "counters": dict(self.counters), "best_score_history": list(self.best_score_history),
+                "component_score_history": {k: list(history) for k, history in self.component_score_history.items()}}
+
+
+class _ConflictCounters:
+    """
+    Per-slot usage counts of teachers, rooms and student classes for one timetable, with
+    the violation total the batch evaluator would report for it kept up to date, so the
+    effect of adding or removing one entry is read off its own resources' counters.
+    """
+    def __init__(self, solver):
+        self.solver = solver
+        self.teachers, self.rooms, self.classes = defaultdict(int), defaultdict(int), defaultdict(int)
+        self.teachers_busy = [0] * len(solver.time_slots)
+        self.rooms_busy = [0] * len(solver.time_slots)
+        self.total = 0
+
+    def _entry_classes(self, entry):
+        return self.solver.cohort_classes[self.solver.entry_cohort_list[entry[4]][entry[0]]]
+
+    def addition_cost(self, entry):
+        """Violations adding the entry would create."""
+        c, t, r, slot, g = entry
+        weights, classes = self.solver.class_weight_list, self.classes
+        cost = (self.teachers.get((slot, t), 0) > 0) + (self.rooms.get((slot, r), 0) > 0)
+        for k in self._entry_classes(entry):
+            if classes.get((slot, k), 0) > 0: cost += weights[k]
+        return cost
+
+    def removal_gain(self, entry):
+        """Violations removing the entry would resolve; positive iff the entry is in a clash."""
+        c, t, r, slot, g = entry
+        weights, classes = self.solver.class_weight_list, self.classes
+        gain = (self.teachers[slot, t] > 1) + (self.rooms[slot, r] > 1)
+        for k in self._entry_classes(entry):
+            if classes[slot, k] > 1: gain += weights[k]
+        return gain
+
+    def add(self, entry):
+        c, t, r, slot, g = entry
+        self.total += self.addition_cost(entry)
+        self.teachers[slot, t] += 1
+        self.rooms[slot, r] += 1
+        for k in self._entry_classes(entry): self.classes[slot, k] += 1
+        self.teachers_busy[slot] |= 1 << t
+        self.rooms_busy[slot] |= 1 << self.solver.room_position[r]
+
+    def remove(self, entry):
+        c, t, r, slot, g = entry
+        self.total -= self.removal_gain(entry)
+        self.teachers[slot, t] -= 1
+        self.rooms[slot, r] -= 1
+        for k in self._entry_classes(entry): self.classes[slot, k] -= 1
+        if not self.teachers[slot, t]: self.teachers_busy[slot] &= ~(1 << t)
+        if not self.rooms[slot, r]: self.rooms_busy[slot] &= ~(1 << self.solver.room_position[r])
+
 
 class AntColonyTimetableSolver:
     """
     Definitive version of the solver. Upgraded to handle semester-specific
     student groups to ensure correct timetables for different years.
     """
-    def __init__(self, courses, teachers, students, classrooms, feedback, elective_choices, constraints):
+    def __init__(self, courses, teachers, students, classrooms, feedback, elective_choices, constraints, seed=None, num_workers=NUM_WORKERS,
+                 local_search_passes=LOCAL_SEARCH_PASSES, decompose=DECOMPOSE, num_ants=NUM_ANTS, num_iterations=NUM_ITERATIONS):
         self.courses = courses
         self.teachers = teachers
         self.students = students
@@ -23,18 +131,45 @@ class AntColonyTimetableSolver:
         self.feedback = feedback
         self.elective_choices = elective_choices
         self.constraints = constraints
+        # Every ant gets its own RNG derived from this master seed, so a run is
+        # reproducible whatever the number of worker processes.
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.num_workers = num_workers
+        self.local_search_passes = local_search_passes
+        self.decompose = decompose
+        self.num_ants = num_ants
+        self.num_iterations = num_iterations
+        self.metrics = SolverMetrics()
 
+        started = time.perf_counter()
         self.time_slots = self._generate_time_slots()
         self.course_periods_map = self._calculate_required_periods()
         
         # --- UPGRADE: Student grouping is now semester-aware ---
         self.student_groups = self._group_students_by_semester()
         self.course_enrollment_map = self._build_course_enrollment_map()
+        self._intern_entities()
+        self._build_elective_cohorts()
+        self.feasibility = self._plan_demand()
         self.scheduling_blocks = self._create_scheduling_blocks()
+        self.group_required_periods = self._required_periods_per_group()
+        self._build_clash_index()
+        self.metrics.add_time('block_creation', time.perf_counter() - started)
+        self.metrics.counters['groups'] = len(self.group_names)
+        self.metrics.counters['blocks'] = len(self.scheduling_blocks)
 
+        self.load_heuristic = [(1 + load) ** -HEURISTIC_WEIGHT for load in range(len(self.scheduling_blocks) + 1)]
         self.pheromone_trails = self._initialize_pheromones()
+        # Entries kept from a previous timetable (see warm_start) and the occupancy they take up.
+        self.fixed_entries = []
+        self.fixed_group_busy = [0] * len(self.group_names)
+        self.fixed_teachers_busy = [0] * len(self.time_slots)
+        self.fixed_rooms_busy = [0] * len(self.time_slots)
+        self.fixed_slot_load = [0] * len(self.time_slots)
+        self.fixed_score = 0
         self.best_timetable = None
         self.best_timetable_score = float('inf')
+        self.stop_reason = None
 
     def _group_students_by_semester(self):
         """Groups students by program, SEMESTER, and section."""
@@ -42,15 +177,109 @@ class AntColonyTimetableSolver:
         for s in self.students:
             # The group key now includes the semester for uniqueness
             groups[f"{s.program}_{s.semester}_{s.section}"].append(s.id)
-        print(f"Created student groups: {list(groups.keys())}")
         return dict(groups)
 
+    def _intern_entities(self):
+        """
+        Maps slots, groups, teachers, rooms and courses to dense integer ids so that
+        per-ant occupancy can be kept as slot bitmasks instead of sets of tuples.
+        """
+        self.slot_index = {slot: i for i, slot in enumerate(self.time_slots)}
+        self.all_slots_mask = (1 << len(self.time_slots)) - 1
+        self.group_names = list(self.student_groups)
+        self.group_index = {name: i for i, name in enumerate(self.group_names)}
+        self.group_students = [self.student_groups[name] for name in self.group_names]
+        self.teacher_index = {t.id: i for i, t in enumerate(self.teachers)}
+        self.room_index = {r.id: i for i, r in enumerate(self.classrooms)}
+        self.course_index = {c.id: i for i, c in enumerate(self.courses)}
+        self.course_ids = [c.id for c in self.courses]
+        self.course_periods = [self.course_periods_map.get(c.id, 0) for c in self.courses]
+        self.elective_course_idx = [i for i, c in enumerate(self.courses) if c.course_type != 'Major']
+        self.elective_course_set = set(self.elective_course_idx)
+        self._build_resource_indexes()
+
+    def _build_resource_indexes(self):
+        """
+        Precomputes the lookups used for every placed block: a bitmask of eligible
+        teachers per course, and rooms sorted by capacity so the smallest adequate
+        free room can be found with a bisect plus one bitwise op per slot.
+        """
+        teachers_by_subject = defaultdict(int)
+        for t, teacher in enumerate(self.teachers):
+            for subject in {teacher.first_preference, teacher.second_preference}:
+                if subject: teachers_by_subject[subject] |= 1 << t
+        self.course_teacher_mask = [teachers_by_subject.get(c.course_name, 0) for c in self.courses]
+
+        self.rooms_by_capacity = sorted(range(len(self.classrooms)), key=lambda r: self.classrooms[r].capacity or 0)
+        self.sorted_room_capacities = [self.classrooms[r].capacity or 0 for r in self.rooms_by_capacity]
+        self.all_rooms_mask = (1 << len(self.classrooms)) - 1
+        self.room_position = [0] * len(self.classrooms)
+        for pos, r in enumerate(self.rooms_by_capacity): self.room_position[r] = pos
+
+    def _build_elective_cohorts(self):
+        """
+        Precomputes, once per solver, everything ants need about electives: a group x course
+        enrollment count matrix, the students of each (group, elective) cohort, and each
+        group's elective demand (one list item per period), which ants copy as a template.
+        """
+        student_group = {s_id: g for g, group_students in enumerate(self.group_students) for s_id in group_students}
+        self.student_electives = defaultdict(set)
+        self.group_course_enrollment = np.zeros((len(self.group_names), len(self.course_ids)), dtype=np.int64)
+        self.group_elective_students = [defaultdict(list) for _ in self.group_names]
+        for c in self.elective_course_idx:
+            for s_id in self.course_enrollment_map.get(self.course_ids[c], ()):
+                g = student_group.get(s_id)
+                if g is None: continue
+                self.student_electives[s_id].add(c)
+                self.group_course_enrollment[g, c] += 1
+        for g, group_students in enumerate(self.group_students):
+            for s_id in group_students:
+                for c in sorted(self.student_electives.get(s_id, ())):
+                    self.group_elective_students[g][c].append(s_id)
+        self.group_elective_demand = [[c for c in self.elective_course_idx if self.group_course_enrollment[g, c] for _ in range(self.course_periods[c])]
+                                      for g in range(len(self.group_names))]
+        self.group_elective_periods = [self._elective_band_periods(g) for g in range(len(self.group_names))]
+
+    def _elective_band_periods(self, g, unplaceable=()):
+        """Periods of a group's elective band: the most any of its students needs for their electives, skipping unplaceable ones."""
+        return max((sum(self.course_periods[c] for c in self.student_electives.get(s_id, ()) if (g, c) not in unplaceable)
+                    for s_id in self.group_students[g]), default=0)
+
+    def _build_clash_index(self):
+        """
+        Precomputes the integer encoding used by the batch clash evaluator. Students of a
+        group with the same elective choices form one class, and every entry's student set
+        (whole group, or the group's cohort of one elective) is a fixed list of classes, so
+        double-bookings can be counted per (slot, class) and weighted by class size.
+        """
+        class_weights, cohort_classes = [], []
+        self.entry_cohort = np.zeros((len(self.group_names), len(self.course_ids)), dtype=np.int64)
+        for g, group_students in enumerate(self.group_students):
+            classes = defaultdict(int)
+            for s_id in group_students:
+                classes[tuple(sorted(self.student_electives.get(s_id, ())))] += 1
+            first_class = len(class_weights)
+            class_weights.extend(classes.values())
+            self.entry_cohort[g, :] = len(cohort_classes)
+            cohort_classes.append(list(range(first_class, len(class_weights))))
+            for c in self.elective_course_idx:
+                members = [first_class + k for k, signature in enumerate(classes) if c in signature]
+                if members:
+                    self.entry_cohort[g, c] = len(cohort_classes)
+                    cohort_classes.append(members)
+        self.class_weights = np.array(class_weights, dtype=np.int64)
+        self.cohort_class_ptr = np.cumsum([0] + [len(m) for m in cohort_classes])
+        self.cohort_class_idx = np.array([k for m in cohort_classes for k in m], dtype=np.int64)
+        # Plain-list copies for the per-entry lookups of the local search.
+        self.cohort_classes, self.class_weight_list = cohort_classes, class_weights
+        self.entry_cohort_list = self.entry_cohort.tolist()
+
     def _build_course_enrollment_map(self):
-        """Maps courses to students, considering program and semester for core courses."""
-        enrollment_map = defaultdict(list)
+        """Maps courses to sets of students, considering program and semester for core courses."""
+        enrollment_map = defaultdict(set)
         # 1. Enroll students in their chosen electives
         for choice in self.elective_choices:
-            enrollment_map[choice.course_id].append(choice.student_id)
+            enrollment_map[choice.course_id].add(choice.student_id)
         
         # 2. UPGRADE: Enroll students in core courses matching their program AND semester
         core_courses = [c for c in self.courses if c.course_type == 'Major']
@@ -62,93 +291,563 @@ class AntColonyTimetableSolver:
             for course in core_courses:
                 if course.program_name == program and course.semester == semester:
                     # Enroll all students of this group into this core course
-                    enrollment_map[course.id].extend(student_ids)
+                    enrollment_map[course.id].update(student_ids)
         return enrollment_map
 
     def _create_scheduling_blocks(self):
         """Creates abstract blocks to be placed on the timetable, respecting semesters."""
         blocks = []
-        core_courses = [c for c in self.courses if c.course_type == 'Major']
-        elective_courses = [c for c in self.courses if c.course_type != 'Major']
-        
-        for group_name, student_ids in self.student_groups.items():
-            program, semester_str, _section = group_name.split('_')
-            semester = int(semester_str)
-            
-            # Create blocks for core courses for this specific semester
-            for course in core_courses:
-                if course.program_name == program and course.semester == semester:
-                    for _ in range(self.course_periods_map.get(course.id, 0)):
-                        blocks.append({'type': 'Core', 'group': group_name, 'course_id': course.id})
+        for g in range(len(self.group_names)):
+            # Create blocks for the group's core courses (see _plan_demand)
+            for c in self.group_core_courses[g]:
+                for _ in range(self.course_periods[c]):
+                    blocks.append((CORE_BLOCK, g, c))
             
             # Create blocks for shared elective slots for this group
-            max_elective_periods = 0
-            for s_id in student_ids:
-                student_elective_periods = 0
-                for course in elective_courses:
-                    if s_id in self.course_enrollment_map.get(course.id, []):
-                        student_elective_periods += self.course_periods_map.get(course.id, 0)
-                if student_elective_periods > max_elective_periods:
-                    max_elective_periods = student_elective_periods
-            
-            for _ in range(max_elective_periods):
-                blocks.append({'type': 'Elective', 'group': group_name})
+            for _ in range(self.group_elective_periods[g]):
+                blocks.append((ELECTIVE_BLOCK, g, -1))
         return blocks
+
+    def _required_periods_per_group(self):
+        """Periods each group needs per course: core blocks plus the periods of every elective it has a cohort for."""
+        required = [Counter(demand) for demand in self.group_elective_demand]
+        for kind, g, c in self.scheduling_blocks:
+            if kind == CORE_BLOCK: required[g][c] += 1
+        return required
     
-    def solve(self):
-        for i in range(NUM_ITERATIONS):
-            all_ant_timetables = [self._construct_solution_for_ant() for _ in range(NUM_ANTS)]
-            if not any(all_ant_timetables): continue
-            self._update_pheromones(all_ant_timetables)
-            print(f"Iteration {i+1}/{NUM_ITERATIONS} | Best Score: {self.best_timetable_score}")
-        return self.best_timetable
-
-    def _construct_solution_for_ant(self):
-        timetable = []
-        occupied_slots = defaultdict(set)
-        group_level_schedule = {}
-        
-        unscheduled_electives = defaultdict(list)
-        elective_courses = [c for c in self.courses if c.course_type != 'Major']
-        for group_name in self.student_groups:
-            for course in elective_courses:
-                if any(s in self.student_groups[group_name] for s in self.course_enrollment_map.get(course.id, [])):
-                    for _ in range(self.course_periods_map.get(course.id, 0)):
-                        unscheduled_electives[group_name].append(course)
-
-        random.shuffle(self.scheduling_blocks)
-        for block in self.scheduling_blocks:
-            group = block['group']
-            available_slots = [s for s in self.time_slots if group not in occupied_slots[('group', s)]]
-            if not available_slots: continue
-            chosen_slot = random.choice(available_slots)
-            occupied_slots[('group', chosen_slot)].add(group)
-            group_level_schedule[(chosen_slot, group)] = block
-
-        for (slot, group), block in group_level_schedule.items():
-            if block['type'] == 'Core':
-                course = next((c for c in self.courses if c.id == block['course_id']), None)
-                if not course: continue
-                teacher = self._find_teacher_for_course(course, occupied_slots, slot)
-                room = self._find_room(occupied_slots, slot, len(self.student_groups[group]))
-                if teacher and room:
-                    timetable.append({'course': course, 'teacher': teacher, 'group': group, 'students': self.student_groups[group], 'room': room, 'slot': slot})
-                    occupied_slots[('teacher', slot)].add(teacher.id)
-                    occupied_slots[('room', slot)].add(room.id)
-            elif block['type'] == 'Elective':
-                electives_to_schedule_now = list(unscheduled_electives[group])
-                for elective_course in electives_to_schedule_now:
-                    students_in_elective = [s for s in self.student_groups[group] if s in self.course_enrollment_map[elective_course.id]]
+    # --- Demand planning ---
+    def _plan_demand(self):
+        """Checks demand against supply before the colony runs, pruning entries that can never be placed; returns the feasibility report."""
+        n_slots = len(self.time_slots)
+        capacities = self.sorted_room_capacities
+        core_courses = defaultdict(list)
+        for c, course in enumerate(self.courses):
+            if course.course_type == 'Major': core_courses[course.program_name, course.semester].append(c)
+        self.group_core_courses = []
+        for name in self.group_names:
+            program, semester, _section = name.split('_')
+            self.group_core_courses.append(list(core_courses.get((program, int(semester)), ())))
+        entries = [(g, c, len(self.group_students[g])) for g, courses in enumerate(self.group_core_courses) for c in courses]
+        entries += [(g, c, len(students)) for g, cohorts in enumerate(self.group_elective_students) for c, students in cohorts.items()]
+        entries = [(g, c, size) for g, c, size in entries if self.course_periods[c]]
+
+        # An entry with no eligible teacher, or more students than the largest room holds, is pruned from its
+        # group's core courses or elective demand rather than costing every ant a slot; the rest is still solved.
+        unplaceable, course_issues, demand = {}, defaultdict(set), Counter()
+        for g, c, size in entries:
+            demand[c] += self.course_periods[c]
+            if not self.course_teacher_mask[c]: unplaceable[g, c] = 'no_teacher'
+            elif not capacities or size > capacities[-1]: unplaceable[g, c] = 'no_room'
+            else: continue
+            course_issues[c].add(unplaceable[g, c])
+        if unplaceable:
+            self.group_core_courses = [[c for c in courses if (g, c) not in unplaceable] for g, courses in enumerate(self.group_core_courses)]
+            self.group_elective_demand = [[c for c in demand_g if (g, c) not in unplaceable] for g, demand_g in enumerate(self.group_elective_demand)]
+            self.group_elective_periods = [self._elective_band_periods(g, unplaceable) for g in range(len(self.group_names))]
+
+        courses = []
+        for c, periods in sorted(demand.items()):
+            mask, teachers, hours = self.course_teacher_mask[c], 0, 0
+            while mask:
+                t = (mask & -mask).bit_length() - 1
+                teachers, hours = teachers + 1, hours + (n_slots if self.teachers[t].working_hours is None else self.teachers[t].working_hours)
+                mask &= mask - 1
+            # teacher_hours is advisory: the solver does not enforce working_hours.
+            if teachers and teachers * n_slots < periods: course_issues[c].add('teacher_slots')
+            if teachers and hours < periods: course_issues[c].add('teacher_hours')
+            if course_issues[c]:
+                courses.append({"course_id": self.course_ids[c], "course_name": self.courses[c].course_name, "demand_periods": periods,
+                                "teachers": teachers, "teacher_slots": teachers * n_slots, "teacher_hours": hours, "issues": sorted(course_issues[c])})
+        groups = []
+        for g, name in enumerate(self.group_names):
+            periods = sum(self.course_periods[c] for c in self.group_core_courses[g]) + self.group_elective_periods[g]
+            if periods > n_slots: groups.append({"group": name, "demand_periods": periods, "slots": n_slots})
+
+        # Hall-type bound per capacity: entries larger than the next smaller capacity all need rooms at least this large.
+        sizes = sorted((size, self.course_periods[c]) for g, c, size in entries if (g, c) not in unplaceable)
+        larger_periods = list(accumulate((periods for _size, periods in reversed(sizes)), initial=0))[::-1]
+        size_keys = [size for size, _periods in sizes]
+        rooms, previous = [], -1
+        for capacity in sorted(set(capacities)):
+            available = len(capacities) - bisect_left(capacities, capacity)
+            rooms.append({"capacity": capacity, "rooms": available, "room_slots": available * n_slots,
+                          "demand_periods": larger_periods[bisect_right(size_keys, previous)]})
+            previous = capacity
+
+        # Only the hard bounds decide feasibility; pruned entries show in unplaceable_periods and courses.
+        feasible = (not groups and all(band["demand_periods"] <= band["room_slots"] for band in rooms)
+                    and not any('teacher_slots' in course["issues"] for course in courses))
+        return {"feasible": feasible, "slots": n_slots, "demand_periods": sum(demand.values()),
+                "unplaceable_periods": sum(self.course_periods[c] for _g, c in unplaceable),
+                "courses": courses, "groups": groups, "rooms": rooms}
+
+    def solve(self, time_budget=None, target_score=0, patience=None, on_progress=None, should_stop=None):
+        """Runs the colony and returns the best timetable, stopping early at target_score, patience, time_budget or should_stop()."""
+        # Unless warm-started, independent components are solved one at a time, or in parallel with
+        # num_workers > 1, each with a share of time_budget in proportion to its blocks.
+        components = self._components() if self.decompose and not self.fixed_entries else []
+        room_masks = self._partition_rooms(components) if len(components) > 1 else None
+        if room_masks:
+            self._solve_components(components, room_masks, time_budget, target_score, patience, on_progress, should_stop)
+        else:
+            self._run(time_budget, target_score, patience, on_progress, should_stop)
+        return self._to_timetable(self.best_timetable) if self.best_timetable else None
+
+    def _run(self, time_budget=None, target_score=0, patience=None, on_progress=None, should_stop=None):
+        """The colony loop of solve, leaving the best compact timetable in self.best_timetable."""
+        started = time.monotonic()
+        self.stop_reason = 'iterations'
+        stale_iterations = 0
+        # After warm_start the fixed entries' score is a lower bound.
+        if target_score is not None: target_score = max(target_score, self.fixed_score)
+        executor = None
+        if self.num_workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker, initargs=(self,))
+        try:
+            for i in range(self.num_iterations):
+                previous_best = self.best_timetable_score
+                all_ant_timetables = self._construct_ants(i, executor)
+                if any(all_ant_timetables): self._update_pheromones(all_ant_timetables)
+                stale_iterations = 0 if self.best_timetable_score < previous_best else stale_iterations + 1
+                elapsed = time.monotonic() - started
+                self.metrics.counters['iterations'] += 1
+                self.metrics.best_score_history.append((i + 1, self.best_timetable_score, elapsed))
+                if on_progress:
+                    on_progress({"iteration": i + 1, "iterations": self.num_iterations, "best_score": self.best_timetable_score, "elapsed": elapsed})
+                if should_stop and should_stop(): self.stop_reason = 'cancelled'
+                elif target_score is not None and self.best_timetable_score <= target_score: self.stop_reason = 'target_score'
+                elif patience is not None and stale_iterations >= patience: self.stop_reason = 'patience'
+                elif time_budget is not None and elapsed >= time_budget: self.stop_reason = 'time_budget'
+                else: continue
+                break
+        finally:
+            if executor: executor.shutdown()
+
+    # --- Decomposition into independent components ---
+    def _components(self):
+        """
+        Splits the groups with blocks into connected components of the conflict graph: two
+        groups are linked when an eligible teacher of one's courses can teach the other's.
+        Students never span groups, and rooms are shared out by _partition_rooms.
+        Returns lists of group indices, largest component first.
+        """
+        parent = list(range(len(self.group_names)))
+        def find(g):
+            while parent[g] != g:
+                parent[g] = parent[parent[g]]
+                g = parent[g]
+            return g
+        groups_by_teacher = {}
+        groups = sorted({g for _kind, g, _c in self.scheduling_blocks})
+        for g in groups:
+            mask = 0
+            for c in self.group_required_periods[g]: mask |= self.course_teacher_mask[c]
+            while mask:
+                low = mask & -mask
+                other = groups_by_teacher.setdefault(low, g)
+                parent[find(g)] = find(other)
+                mask ^= low
+        components = defaultdict(list)
+        for g in groups: components[find(g)].append(g)
+        return sorted(components.values(), key=len, reverse=True)
+
+    def _partition_rooms(self, components):
+        """
+        Deals the rooms out from the largest, each to the component with the fewest rooms per
+        period it schedules, so every component gets a share of each capacity band. Returns
+        one room mask (capacity positions) per component, or None if a component would be
+        left without a room for its largest group.
+        """
+        demand = [sum(sum(self.group_required_periods[g].values()) for g in groups) for groups in components]
+        masks, allocated = [0] * len(components), [0] * len(components)
+        for pos in reversed(range(len(self.rooms_by_capacity))):
+            k = min(range(len(components)), key=lambda k: (allocated[k] + 1) / demand[k])
+            masks[k] |= 1 << pos
+            allocated[k] += 1
+        for groups, mask in zip(components, masks):
+            largest = max(len(self.group_students[g]) for g in groups)
+            if not mask >> bisect_left(self.sorted_room_capacities, largest): return None
+        return masks
+
+    def _component_solver(self, k, groups, room_mask):
+        """
+        A copy restricted to one component's blocks and rooms, with its own trails and results.
+        Copying goes through __getstate__, so it shares the read-only indexes but not the ORM lists.
+        """
+        groups = set(groups)
+        component = copy.copy(self)
+        component.seed = f"{self.seed}/{k}"
+        component.num_workers = 1
+        component.scheduling_blocks = [block for block in self.scheduling_blocks if block[1] in groups]
+        component.all_rooms_mask = room_mask
+        component.pheromone_trails = self._initialize_pheromones()
+        component.metrics = SolverMetrics()
+        component.best_timetable, component.best_timetable_score = None, float('inf')
+        return component
+
+    def _solve_components(self, components, room_masks, time_budget, target_score, patience, on_progress, should_stop):
+        """
+        Solves every component, then merges their timetables and scores the result as a whole.
+        Worker processes report progress and check should_stop once per finished component.
+        """
+        started = time.monotonic()
+        parallel = min(self.num_workers, len(components))
+        group_blocks = Counter(g for _kind, g, _c in self.scheduling_blocks)
+        blocks = [sum(group_blocks[g] for g in groups) for groups in components]
+        options = [{"time_budget": None if time_budget is None else min(time_budget, time_budget * parallel * n / sum(blocks)),
+                    "target_score": target_score, "patience": patience} for n in blocks]
+        self.metrics.counters['components'] = len(components)
+        self.stop_reason = None
+        merged, finished_score, reasons = [], 0, []
+
+        def finish(k, timetable, score, reason, metrics, report=False):
+            nonlocal finished_score
+            merged.extend(timetable or ())
+            finished_score += score if timetable else 0
+            reasons.append(reason)
+            self.metrics.merge(metrics)
+            self.metrics.component_score_history[k + 1] = list(metrics.best_score_history)
+            if report and on_progress:
+                on_progress({"iteration": metrics.counters['iterations'], "iterations": self.num_iterations, "best_score": finished_score,
+                             "elapsed": time.monotonic() - started, "component": k + 1, "components": len(components)})
+
+        if parallel > 1:
+            # Workers receive the solver once and build their components from it.
+            with ProcessPoolExecutor(max_workers=parallel, initializer=_init_worker, initargs=(self,)) as executor:
+                futures = [executor.submit(_solve_component, (k, groups, mask, o)) for k, (groups, mask, o) in enumerate(zip(components, room_masks, options))]
+                for k, future in enumerate(futures):
+                    finish(k, *future.result(), report=True)
+                    if should_stop and should_stop():
+                        for pending in futures: pending.cancel()
+                        self.stop_reason = 'cancelled'
+                        break
+        else:
+            for k, (groups, mask, component_options) in enumerate(zip(components, room_masks, options)):
+                def component_progress(progress, k=k):
+                    if on_progress:
+                        on_progress({**progress, "best_score": finished_score + progress["best_score"],
+                                     "elapsed": time.monotonic() - started, "component": k + 1, "components": len(components)})
+                component = self._component_solver(k, groups, mask)
+                component._run(**component_options, on_progress=component_progress, should_stop=should_stop)
+                finish(k, component.best_timetable, component.best_timetable_score, component.stop_reason, component.metrics)
+                if component.stop_reason == 'cancelled': break
+
+        # Components share no teachers, students or rooms, so this re-check should find no new clashes.
+        self.best_timetable = merged or None
+        self.best_timetable_score = self._evaluate_timetable(merged)
+        if 'cancelled' in reasons: self.stop_reason = 'cancelled'
+        elif self.stop_reason is None:
+            if target_score is not None and self.best_timetable_score <= target_score: self.stop_reason = 'target_score'
+            # A component that ran out of time makes the whole result depend on the machine's speed (see cacheable).
+            elif 'time_budget' in reasons: self.stop_reason = 'time_budget'
+            else: self.stop_reason = next((r for r in reasons if r != 'target_score'), reasons[-1])
+
+    # --- Incremental re-solve ---
+    def warm_start(self, previous_timetable):
+        """
+        Prepares an incremental re-solve from a published Timetable (as returned by solve).
+        A group keeps its previous entries fixed if they still match the current
+        courses, teachers, rooms and enrollments; ants then only place the blocks of the
+        remaining groups, around the fixed occupancy, with pheromones biased towards the
+        previous slots. Returns the names of the groups that will be re-placed.
+        """
+        entries_by_group = defaultdict(list)
+        previous_entries = list(previous_timetable.entries()) if previous_timetable else []
+        for entry in previous_entries:
+            entries_by_group[entry['group']].append(entry)
+        affected = set()
+        for g, name in enumerate(self.group_names):
+            kept = self._reusable_entries(g, entries_by_group.get(name, ()), self.group_required_periods[g])
+            if kept is None:
+                affected.add(g)
+                continue
+            self.fixed_entries.extend(kept)
+            for c, t, r, slot, _g in kept:
+                self.fixed_teachers_busy[slot] |= 1 << t
+                self.fixed_rooms_busy[slot] |= 1 << self.room_position[r]
+                if not self.fixed_group_busy[g] >> slot & 1:
+                    self.fixed_group_busy[g] |= 1 << slot
+                    self.fixed_slot_load[slot] += 1
+        self.scheduling_blocks = [block for block in self.scheduling_blocks if block[1] in affected]
+        self.fixed_score = self._evaluate_timetable(self.fixed_entries) if self.fixed_entries else 0
+
+        rows, slots = [], []
+        for entry in previous_entries:
+            c, slot, g = self.course_index.get(entry['course'].id), self.slot_index.get(entry['slot']), self.group_index.get(entry['group'])
+            if c is None or slot is None: continue
+            rows.append(c); slots.append(slot)
+            if c in self.elective_course_set and g is not None:
+                rows.append(len(self.courses) + g); slots.append(slot)
+        np.add.at(self.pheromone_trails, (rows, slots), WARM_START_DEPOSIT)
+
+        self.metrics.counters['blocks'] = len(self.scheduling_blocks)
+        self.metrics.counters['fixed_entries'] = len(self.fixed_entries)
+        self.metrics.counters['replaced_groups'] = len(affected)
+        return [self.group_names[g] for g in sorted(affected)]
+
+    def _reusable_entries(self, g, entries, required_periods):
+        """A group's previous entries in compact form, or None if any is stale or the set is incomplete."""
+        if not entries: return None
+        kept, periods, checked = [], Counter(), set()
+        for entry in entries:
+            c, t = self.course_index.get(entry['course'].id), self.teacher_index.get(entry['teacher'].id)
+            r, slot = self.room_index.get(entry['room'].id), self.slot_index.get(entry['slot'])
+            if c is None or t is None or r is None or slot is None: return None
+            if not self.course_teacher_mask[c] >> t & 1: return None
+            students = self._entry_students(g, c)
+            if not students or (self.classrooms[r].capacity or 0) < len(students): return None
+            if c not in checked:
+                if sorted(entry['students']) != sorted(students): return None
+                checked.add(c)
+            kept.append((c, t, r, slot, g))
+            periods[c] += 1
+        return kept if periods == required_periods else None
+
+    def _construct_ants(self, iteration, executor=None):
+        """Builds the num_ants timetables of one iteration, serially or across the worker pool."""
+        trail_weights = self._trail_weights()
+        seeds = [self._ant_seed(iteration, ant) for ant in range(self.num_ants)]
+        if executor is None:
+            return [self._construct_solution_for_ant(trail_weights, random.Random(seed)) for seed in seeds]
+        chunk = -(-len(seeds) // self.num_workers)
+        timetables = []
+        for batch, worker_metrics in executor.map(_construct_ant_batch, [(trail_weights, seeds[i:i + chunk]) for i in range(0, len(seeds), chunk)]):
+            timetables.extend(batch)
+            self.metrics.merge(worker_metrics)
+        return timetables
+
+    def _ant_seed(self, iteration, ant):
+        return f"{self.seed}:{iteration}:{ant}"
+
+    def __getstate__(self):
+        """Ships only the interned, read-only construction data to worker processes."""
+        state = self.__dict__.copy()
+        for key in ('courses', 'teachers', 'students', 'classrooms', 'feedback', 'elective_choices',
+                    'pheromone_trails', 'best_timetable'):
+            state[key] = None
+        return state
+
+    def _construct_solution_for_ant(self, trail_weights=None, rng=random):
+        """
+        Builds one candidate timetable. Occupancy is tracked as one slot bitmask per
+        group and, per slot, bitmasks of busy teachers and rooms (in capacity order),
+        so free-slot and clash checks are bitwise operations. Slots are sampled in
+        proportion to pheromone^alpha * heuristic^beta. Starts from the fixed entries
+        kept by warm_start, if any.
+        Returns compact entries: (course_idx, teacher_idx, room_idx, slot_idx, group_idx); the
+        students of an entry are its group's, or the group's cohort of an elective.
+        """
+        if trail_weights is None: trail_weights = self._trail_weights()
+        metrics, failed = self.metrics, self.metrics.failed_placements
+        started = time.perf_counter()
+        timetable = list(self.fixed_entries)
+        group_busy = list(self.fixed_group_busy)
+        teachers_busy = list(self.fixed_teachers_busy)
+        rooms_busy = list(self.fixed_rooms_busy)
+        group_level_schedule = []
+        slot_load = list(self.fixed_slot_load)
+
+        unscheduled_electives = [list(demand) for demand in self.group_elective_demand]
+
+        blocks = list(self.scheduling_blocks)
+        rng.shuffle(blocks)
+        for block in blocks:
+            kind, g, c = block
+            free_slots = self.all_slots_mask & ~group_busy[g]
+            if not free_slots:
+                # Elective periods left over are counted once, after the band is placed.
+                if kind == CORE_BLOCK: failed['no_slot'] += 1
+                continue
+            slot = self._sample_slot(free_slots, trail_weights[self._trail_row(kind, g, c)], slot_load, rng)
+            group_busy[g] |= 1 << slot
+            slot_load[slot] += 1
+            group_level_schedule.append((slot, block))
+        assigned = time.perf_counter()
+        metrics.add_time('slot_assignment', assigned - started)
+
+        # Why each elective period was last left out; those never tried had no band slot.
+        elective_failures = {}
+        for slot, (kind, g, c) in group_level_schedule:
+            if kind == CORE_BLOCK:
+                students = self.group_students[g]
+                t = self._find_teacher_for_course(c, teachers_busy[slot])
+                pos = self._find_room(rooms_busy[slot], len(students))
+                if t is not None and pos is not None:
+                    timetable.append((c, t, self.rooms_by_capacity[pos], slot, g))
+                    teachers_busy[slot] |= 1 << t
+                    rooms_busy[slot] |= 1 << pos
+                else: failed['no_teacher' if t is None else 'no_room'] += 1
+            else:
+                for elective in list(unscheduled_electives[g]):
+                    students_in_elective = self.group_elective_students[g][elective]
                     if not students_in_elective: continue
-                    teacher = self._find_teacher_for_course(elective_course, occupied_slots, slot)
-                    room = self._find_room(occupied_slots, slot, len(students_in_elective))
-                    if teacher and room:
-                        timetable.append({'course': elective_course, 'teacher': teacher, 'group': group, 'students': students_in_elective, 'room': room, 'slot': slot})
-                        occupied_slots[('teacher', slot)].add(teacher.id)
-                        occupied_slots[('room', slot)].add(room.id)
-                        unscheduled_electives[group].remove(elective_course)
+                    t = self._find_teacher_for_course(elective, teachers_busy[slot])
+                    pos = self._find_room(rooms_busy[slot], len(students_in_elective))
+                    if t is not None and pos is not None:
+                        timetable.append((elective, t, self.rooms_by_capacity[pos], slot, g))
+                        teachers_busy[slot] |= 1 << t
+                        rooms_busy[slot] |= 1 << pos
+                        unscheduled_electives[g].remove(elective)
+                    else: elective_failures[g, elective] = 'no_teacher' if t is None else 'no_room'
+        # Only groups with blocks here: not another component's, nor those warm_start kept.
+        for g in {g for _kind, g, _c in blocks}:
+            for elective in unscheduled_electives[g]:
+                if self.group_elective_students[g].get(elective): failed[elective_failures.get((g, elective), 'no_slot')] += 1
+        metrics.add_time('resource_lookup', time.perf_counter() - assigned)
+        metrics.counters['ants'] += 1
+        metrics.counters['blocks_placed'] += len(group_level_schedule)
+        metrics.counters['entries_placed'] += len(timetable) - len(self.fixed_entries)
+        if self.local_search_passes: self._repair(timetable, rng)
         return timetable
 
+    # --- Local-search repair ---
+    def _repair(self, timetable, rng):
+        """
+        Improves an ant's timetable in place: each pass moves entries involved in a clash
+        to the slot where they clash least (taking a free eligible teacher and best-fit
+        free room there), or swaps them with another entry of their group when no move
+        helps; then periods construction had to drop are inserted wherever they fit
+        without a clash. Moves are scored from _ConflictCounters, never by rescoring the
+        timetable, and the fixed entries of a warm start are left alone.
+        """
+        if not self.scheduling_blocks: return
+        started = time.perf_counter()
+        counters = _ConflictCounters(self)
+        for entry in timetable: counters.add(entry)
+        first = len(self.fixed_entries)
+        group_entries = defaultdict(list)
+        for i in range(first, len(timetable)): group_entries[timetable[i][4]].append(i)
+        moves = swaps = 0
+        for _ in range(self.local_search_passes):
+            if not counters.total: break
+            conflicting = [i for i in range(first, len(timetable)) if counters.removal_gain(timetable[i])]
+            rng.shuffle(conflicting)
+            improved = False
+            for i in conflicting:
+                entry = timetable[i]
+                if not counters.removal_gain(entry): continue
+                moved = self._best_move(entry, counters, rng)
+                if moved is not None:
+                    counters.remove(entry); counters.add(moved)
+                    timetable[i] = moved
+                    moves += 1; improved = True
+                    continue
+                for j in group_entries[entry[4]]:
+                    if timetable[j][3] != entry[3] and self._try_swap(i, j, timetable, counters):
+                        swaps += 1; improved = True
+                        break
+            if not improved: break
+        insertions = self._insert_missing(timetable, counters, rng)
+        self.metrics.add_time('local_search', time.perf_counter() - started)
+        self.metrics.counters['repair_moves'] += moves
+        self.metrics.counters['repair_swaps'] += swaps
+        self.metrics.counters['repair_insertions'] += insertions
+
+    def _relocate(self, c, g, size, slot, counters, t=None, r=None):
+        """
+        Entry for course c of group g, attended by `size` students, at slot, keeping teacher
+        t and room r if they are free there, else taking the first free eligible teacher and
+        the best-fit free room. Falls back to t and r when nothing is free; None if that
+        leaves no teacher or room.
+        """
+        busy_teachers, busy_rooms = counters.teachers_busy[slot], counters.rooms_busy[slot]
+        if t is None or busy_teachers >> t & 1:
+            free = self._find_teacher_for_course(c, busy_teachers)
+            if free is not None: t = free
+        if r is None or busy_rooms >> self.room_position[r] & 1:
+            pos = self._find_room(busy_rooms, size)
+            if pos is not None: r = self.rooms_by_capacity[pos]
+        if t is None or r is None: return None
+        return (c, t, r, slot, g)
+
+    def _best_move(self, entry, counters, rng):
+        """The relocation of entry that removes the most violations, or None if no slot improves on staying."""
+        c, t, r, current, g = entry
+        size = len(self._entry_students(g, c))
+        best_cost, candidates = counters.removal_gain(entry), []
+        for slot in range(len(self.time_slots)):
+            if slot == current: continue
+            moved = self._relocate(c, g, size, slot, counters, t, r)
+            cost = counters.addition_cost(moved)
+            if cost < best_cost: best_cost, candidates = cost, [moved]
+            elif cost == best_cost and candidates: candidates.append(moved)
+        return rng.choice(candidates) if candidates else None
+
+    def _try_swap(self, i, j, timetable, counters):
+        """Exchanges the slots of entries i and j if that lowers the violation total; reverts otherwise."""
+        a, b = timetable[i], timetable[j]
+        before = counters.total
+        counters.remove(a); counters.remove(b)
+        swapped_a = self._relocate(a[0], a[4], len(self._entry_students(a[4], a[0])), b[3], counters, a[1], a[2])
+        counters.add(swapped_a)
+        swapped_b = self._relocate(b[0], b[4], len(self._entry_students(b[4], b[0])), a[3], counters, b[1], b[2])
+        counters.add(swapped_b)
+        if counters.total < before:
+            timetable[i], timetable[j] = swapped_a, swapped_b
+            return True
+        counters.remove(swapped_a); counters.remove(swapped_b)
+        counters.add(a); counters.add(b)
+        return False
+
+    def _insert_missing(self, timetable, counters, rng):
+        """Adds the periods construction dropped wherever a free teacher and room make them clash-free."""
+        placed = Counter((e[4], e[0]) for e in timetable)
+        slots = list(range(len(self.time_slots)))
+        inserted = 0
+        for g in sorted({g for _kind, g, _c in self.scheduling_blocks}):
+            for c, periods in self.group_required_periods[g].items():
+                missing = periods - placed[g, c]
+                if missing <= 0: continue
+                size = len(self._entry_students(g, c))
+                rng.shuffle(slots)
+                for slot in slots:
+                    entry = self._relocate(c, g, size, slot, counters)
+                    if entry is None or counters.addition_cost(entry): continue
+                    timetable.append(entry)
+                    counters.add(entry)
+                    inserted += 1; missing -= 1
+                    if not missing: break
+        return inserted
+
+    def _sample_slot(self, free_slots, trail_row, slot_load, rng):
+        """
+        Samples one free slot with probability proportional to its pheromone weight
+        times the heuristic, which favours slots with fewer blocks already placed
+        (less competition for teachers and rooms).
+        """
+        slots, weights = [], []
+        while free_slots:
+            low = free_slots & -free_slots
+            slot = low.bit_length() - 1
+            slots.append(slot)
+            weights.append(trail_row[slot] * self.load_heuristic[slot_load[slot]])
+            free_slots ^= low
+        return rng.choices(slots, weights)[0]
+
+    def _trail_row(self, kind, group_idx, course_idx):
+        """Core blocks follow their course's trail; elective blocks follow their group's elective band."""
+        return course_idx if kind == CORE_BLOCK else len(self.course_ids) + group_idx
+
+    def _trail_weights(self):
+        """Pheromone^alpha as plain lists; constant for all ants of one iteration."""
+        return (self.pheromone_trails ** PHEROMONE_INFLUENCE).tolist()
+
+    def _entry_students(self, g, c):
+        """Students of an entry: the group's for a core course, the group's cohort for an elective."""
+        return self.group_elective_students[g].get(c) if c in self.elective_course_set else self.group_students[g]
+
+    def _to_timetable(self, timetable):
+        """Columnar Timetable of compact solver entries, indexed like the solver's own lookups."""
+        result = Timetable(self.courses, self.teachers, self.classrooms, self.time_slots)
+        cohorts = {}
+        for c, t, r, slot, g in timetable:
+            cohort = cohorts.get((g, c))
+            if cohort is None:
+                group = self.group_names[g]
+                cohort = cohorts[g, c] = result.add_cohort(cohort_key(self.courses[c], group), group, self._entry_students(g, c))
+            result.append(c, t, r, slot, cohort)
+        return result
+
     def _calculate_required_periods(self):
         course_periods_map = {}
         total_periods = len(self.time_slots)
@@ -165,30 +864,45 @@ class AntColonyTimetableSolver:
         return self._check_clashes(timetable) * HARD_PENALTY
         
     def _check_clashes(self, timetable):
-        violations = 0
-        teacher_slots, room_slots, student_slots = set(), set(), set()
-        for entry in timetable:
-            slot = entry['slot']
-            if (entry['teacher'].id, slot) in teacher_slots: violations +=1
-            teacher_slots.add((entry['teacher'].id, slot))
-            if (entry['room'].id, slot) in room_slots: violations += 1
-            room_slots.add((entry['room'].id, slot))
-            for student_id in entry['students']:
-                if (student_id, slot) in student_slots: violations += 1
-                student_slots.add((student_id, slot))
+        return int(self._check_clashes_batch([timetable])[0])
+
+    def _check_clashes_batch(self, timetables):
+        """
+        Counts teacher, room and student double-bookings for several timetables at once.
+        Every (resource, slot) seen k times in a timetable adds k - 1 violations; students
+        are counted per class (see _build_clash_index) and weighted by class size.
+        """
+        n_ants, n_slots = len(timetables), len(self.time_slots)
+        entries = np.array([e for tt in timetables for e in tt], dtype=np.int64).reshape(-1, 5)
+        if not len(entries): return np.zeros(n_ants, dtype=np.int64)
+        ant_slot = np.repeat(np.arange(n_ants), [len(tt) for tt in timetables]) * n_slots + entries[:, 3]
+        violations = self._count_repeats(ant_slot, entries[:, 1], len(self.teacher_index), n_ants)
+        violations += self._count_repeats(ant_slot, entries[:, 2], len(self.room_index), n_ants)
+
+        cohorts = self.entry_cohort[entries[:, 4], entries[:, 0]]
+        starts, sizes = self.cohort_class_ptr[cohorts], np.diff(self.cohort_class_ptr)[cohorts]
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        classes = self.cohort_class_idx[np.repeat(starts, sizes) + offsets]
+        violations += self._count_repeats(np.repeat(ant_slot, sizes), classes, len(self.class_weights), n_ants, self.class_weights)
         return violations
+
+    def _count_repeats(self, ant_slot, resource, n_resources, n_ants, weights=None):
+        """Per ant, sum of (occurrences - 1) over every (slot, resource) pair, optionally weighted per resource."""
+        keys, counts = np.unique(ant_slot * n_resources + resource, return_counts=True)
+        repeats = counts - 1
+        if weights is not None: repeats = repeats * weights[keys % n_resources]
+        return np.bincount(keys // n_resources // len(self.time_slots), weights=repeats, minlength=n_ants).astype(np.int64)
         
-    def _find_teacher_for_course(self, course, occupied_slots, slot):
-        suitable_teachers = [t for t in self.teachers if course.course_name in (t.first_preference, t.second_preference)]
-        for teacher in suitable_teachers:
-            if teacher.id not in occupied_slots[('teacher', slot)]: return teacher
-        return None
-
-    def _find_room(self, occupied_slots, slot, num_students):
-        for room in self.classrooms:
-            if room.id not in occupied_slots[('room', slot)] and room.capacity >= num_students:
-                return room
-        return None
+    def _find_teacher_for_course(self, course_idx, busy_teachers):
+        """Returns the first eligible teacher free in the slot, or None."""
+        free = self.course_teacher_mask[course_idx] & ~busy_teachers
+        return (free & -free).bit_length() - 1 if free else None
+
+    def _find_room(self, busy_rooms, num_students):
+        """Best fit: position (in capacity order) of the smallest free room that holds num_students."""
+        smallest = bisect_left(self.sorted_room_capacities, num_students)
+        free = (self.all_rooms_mask & ~busy_rooms) >> smallest << smallest
+        return (free & -free).bit_length() - 1 if free else None
         
     def _generate_time_slots(self):
         slots = []; days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
@@ -196,15 +910,52 @@ class AntColonyTimetableSolver:
             for period in range(1, self.constraints.get('periods_per_day', 8) + 1): slots.append(f"{day}_{period}")
         return slots
         
-    def _initialize_pheromones(self): return defaultdict(lambda: 1.0)
+    def _initialize_pheromones(self):
+        """Dense (course + elective band per group) x slot matrix."""
+        return np.ones((len(self.course_ids) + len(self.group_names), len(self.time_slots)))
     
     def _update_pheromones(self, all_ant_timetables):
-        for tt in all_ant_timetables:
+        started = time.perf_counter()
+        scores = self._check_clashes_batch(all_ant_timetables) * HARD_PENALTY
+        evaluated = time.perf_counter()
+        self.metrics.add_time('evaluation', evaluated - started)
+        for tt, score in zip(all_ant_timetables, scores.tolist()):
             if not tt: continue
-            score = self._evaluate_timetable(tt)
             if score < self.best_timetable_score: self.best_timetable_score, self.best_timetable = score, tt
         if self.best_timetable:
-             for key in self.pheromone_trails: self.pheromone_trails[key] *= (1 - PHEROMONE_EVAPORATION_RATE)
-             deposit = PHEROMONE_DEPOSIT_STRENGTH / (self.best_timetable_score + 1e-5)
-             for entry in self.best_timetable: self.pheromone_trails[(entry['course'].id, entry['slot'])] += deposit
+            # The best timetable's slots converge to PHEROMONE_DEPOSIT_STRENGTH / (1 + clashes per
+            # block) and the others decay to PHEROMONE_MIN, whatever the size of the problem.
+            clashes = self.best_timetable_score / HARD_PENALTY
+            deposit = PHEROMONE_EVAPORATION_RATE * PHEROMONE_DEPOSIT_STRENGTH / (1 + clashes / max(len(self.scheduling_blocks), 1))
+            self.pheromone_trails *= (1 - PHEROMONE_EVAPORATION_RATE)
+            rows, slots = [], []
+            for course, _teacher, _room, slot, group in self.best_timetable:
+                rows.append(course); slots.append(slot)
+                if course in self.elective_course_set:
+                    rows.append(len(self.course_ids) + group); slots.append(slot)
+            np.add.at(self.pheromone_trails, (rows, slots), deposit)
+            np.maximum(self.pheromone_trails, PHEROMONE_MIN, out=self.pheromone_trails)
+        self.metrics.add_time('pheromone_update', time.perf_counter() - evaluated)
+
+
+
+# --- Worker-process side of parallel ant construction and component solves ---
+_WORKER_SOLVER = None
+
+def _init_worker(solver):
+    global _WORKER_SOLVER
+    _WORKER_SOLVER = solver
+
+def _construct_ant_batch(args):
+    """Builds a batch of ants and returns them with the metrics recorded while doing so."""
+    trail_weights, seeds = args
+    _WORKER_SOLVER.metrics = SolverMetrics()
+    timetables = [_WORKER_SOLVER._construct_solution_for_ant(trail_weights, random.Random(seed)) for seed in seeds]
+    return timetables, _WORKER_SOLVER.metrics
 
+def _solve_component(args):
+    """Solves one component of the worker's solver; returns its compact best timetable, score, stop reason and metrics."""
+    k, groups, room_mask, options = args
+    component = _WORKER_SOLVER._component_solver(k, groups, room_mask)
+    component._run(**options)
+    return component.best_timetable, component.best_timetable_score, component.stop_reason, component.metrics
@@ -0,0 +1,170 @@
+import time
+from array import array
+from sqlalchemy import func, select
+
+from models import (TimetableVersion, TimetableEntry, TimetableCohortMember, CancellationRequest, SubstitutionOffer,
+                    TimetableChange, TIMETABLE_DATA_VERSION, bump_data_version, read_data_version)
+from timetable import Timetable
+
+# --- Constants ---
+KEEP_TIMETABLE_VERSIONS = 5
+# Logged changes kept for other processes to replay; a process further behind reloads instead.
+TIMETABLE_CHANGE_LOG_SIZE = 1000
+
+
+class StaleTimetableError(RuntimeError):
+    """Another process changed the timetable after the caller's snapshot of it was loaded."""
+
+
+def _advance_timetable(db_session, snapshot, check=True):
+    """Bumps the timetable data version in the caller's transaction and records it on snapshot, which with check must be current."""
+    expected = snapshot.data_version if check and snapshot is not None else None
+    data_version = bump_data_version(db_session, TIMETABLE_DATA_VERSION, expected)
+    if data_version is None: raise StaleTimetableError("The timetable was changed by another process.")
+    if snapshot is not None: snapshot.data_version = data_version
+    return data_version
+
+
+def _log_change(db_session, data_version, kind, payload):
+    """Logs the change that produced data_version for other processes to replay (see TimetableSnapshot.replay)."""
+    db_session.add(TimetableChange(data_version=data_version, kind=kind, payload=payload))
+    db_session.query(TimetableChange).filter(TimetableChange.data_version <= data_version - TIMETABLE_CHANGE_LOG_SIZE).delete(synchronize_session=False)
+
+
+def load_timetable_changes(Session, since):
+    """(data_version, changes): the logged (kind, payload) changes after since, or None if one of them is not logged."""
+    with Session() as db_session:
+        data_version = read_data_version(db_session, TIMETABLE_DATA_VERSION)
+        # New versions and reference data uploads are not logged; neither are changes pruned from the log.
+        changes = db_session.execute(select(TimetableChange.kind, TimetableChange.payload)
+                                     .where(TimetableChange.data_version > since, TimetableChange.data_version <= data_version)
+                                     .order_by(TimetableChange.data_version)).all()
+    return data_version, ([tuple(change) for change in changes] if len(changes) == data_version - since else None)
+
+
+def save_timetable(Session, timetable, best_score, dataset_version, snapshot=None):
+    """
+    Writes a generated Timetable as a new version in a single transaction using bulk
+    inserts. Student membership is stored once per cohort rather than per entry. Fills
+    the timetable's entry_id column with the database ids and returns the version id.
+    A new version replaces whatever other processes have, so snapshot is not checked.
+    """
+    with Session() as db_session, db_session.begin():
+        _advance_timetable(db_session, snapshot, check=False)
+        version = TimetableVersion(created_at=time.time(), best_score=best_score, dataset_version=dataset_version)
+        db_session.add(version)
+        db_session.flush()
+        course_ids, teacher_ids, room_ids = ([item.id for item in items] for items in (timetable.courses, timetable.teachers, timetable.rooms))
+        entry_rows = [{'version_id': version.id, 'course_id': course_ids[c], 'teacher_id': teacher_ids[t],
+                       'room_id': room_ids[r], 'slot': timetable.slots[slot], 'group_name': timetable.cohort_groups[cohort],
+                       'cohort': timetable.cohort_keys[cohort], 'status': 'active'}
+                      for c, t, r, slot, cohort in zip(timetable.course, timetable.teacher, timetable.room, timetable.slot, timetable.cohort)]
+        member_rows = [{'version_id': version.id, 'cohort': cohort, 'student_id': student_id}
+                       for cohort, students in zip(timetable.cohort_keys, timetable.cohort_students) for student_id in students]
+        connection = db_session.connection()
+        # Ids come from the database (batched INSERT ... RETURNING), in the order of the rows.
+        entry_ids = connection.execute(TimetableEntry.__table__.insert().returning(TimetableEntry.id, sort_by_parameter_order=True),
+                                       entry_rows).scalars().all() if entry_rows else []
+        timetable.entry_id = array('q', entry_ids)
+        if member_rows: connection.execute(TimetableCohortMember.__table__.insert(), member_rows)
+        _prune_versions(db_session)
+        return version.id
+
+
+def _prune_versions(db_session):
+    kept = select(TimetableVersion.id).order_by(TimetableVersion.id.desc()).limit(KEEP_TIMETABLE_VERSIONS).scalar_subquery()
+    stale_versions = select(TimetableVersion.id).where(TimetableVersion.id.not_in(kept))
+    stale_entries = select(TimetableEntry.id).where(TimetableEntry.version_id.in_(stale_versions))
+    db_session.query(CancellationRequest).filter(CancellationRequest.timetable_entry_id.in_(stale_entries)).delete(synchronize_session=False)
+    db_session.query(SubstitutionOffer).filter(SubstitutionOffer.cancelled_entry_id.in_(stale_entries)).delete(synchronize_session=False)
+    db_session.query(TimetableCohortMember).filter(TimetableCohortMember.version_id.in_(stale_versions)).delete(synchronize_session=False)
+    db_session.query(TimetableEntry).filter(TimetableEntry.version_id.in_(stale_versions)).delete(synchronize_session=False)
+    db_session.query(TimetableVersion).filter(TimetableVersion.id.in_(stale_versions)).delete(synchronize_session=False)
+
+
+def load_published_timetable(Session, reference):
+    """
+    Loads the latest timetable version into a Timetable over the reference data, with its
+    pending cancellation requests and open substitution offers. Returns (version_id,
+    timetable, cancellation_requests, open_offers), the offers as (cancelled_row, offer_id,
+    teacher_id) tuples; version_id and timetable are None when nothing has been published
+    yet. Entries whose course, teacher or room no longer exists are left out.
+    """
+    with Session() as db_session:
+        version_id = db_session.execute(select(func.max(TimetableVersion.id))).scalar()
+        if version_id is None: return None, None, [], []
+        rows = db_session.execute(select(TimetableEntry.id, TimetableEntry.course_id, TimetableEntry.teacher_id, TimetableEntry.room_id,
+                                         TimetableEntry.slot, TimetableEntry.group_name, TimetableEntry.cohort, TimetableEntry.status)
+                                  .where(TimetableEntry.version_id == version_id))
+        cohort_students = {}
+        for cohort, student_id in db_session.execute(select(TimetableCohortMember.cohort, TimetableCohortMember.student_id)
+                                                     .where(TimetableCohortMember.version_id == version_id)):
+            cohort_students.setdefault(cohort, []).append(student_id)
+        timetable = Timetable(reference.courses, reference.teachers, reference.classrooms)
+        rows_by_id = {}
+        for entry_id, course_id, teacher_id, room_id, slot, group, cohort, status in rows:
+            c, t, r = timetable.course_index.get(course_id), timetable.teacher_index.get(teacher_id), timetable.room_index.get(room_id)
+            if c is None or t is None or r is None: continue
+            k = timetable.add_cohort(cohort, group, cohort_students.get(cohort, ()))
+            rows_by_id[entry_id] = timetable.append(c, t, r, timetable.slot_position(slot), k, entry_id, status != 'cancelled')
+
+        cancellation_requests = [cancellation_request_view(r.id, timetable.entry(rows_by_id[r.timetable_entry_id]))
+                                 for r in db_session.query(CancellationRequest).filter(CancellationRequest.status == 'pending')
+                                 if r.timetable_entry_id in rows_by_id]
+        open_offers = [(rows_by_id[o.cancelled_entry_id], o.id, o.offered_to_teacher_id)
+                       for o in db_session.query(SubstitutionOffer).filter(SubstitutionOffer.status == 'offered')
+                       if o.cancelled_entry_id in rows_by_id]
+        return version_id, timetable, cancellation_requests, open_offers
+
+
+def cancellation_request_view(request_id, entry):
+    return {"id": request_id, "timetable_entry_id": entry['id'], "teacher_id": entry['teacher'].id, "slot": entry['slot'],
+            "course_name": entry['course'].course_name, "group": entry['group'], "students": entry['students']}
+
+
+def substitution_offer_view(offer_id, entry, teacher_id):
+    offer_details = {"course_id": entry['course'].id, "group": entry['group'], "cohort": entry['cohort'], "students": entry['students'], "room_id": entry['room'].id, "slot": entry['slot']}
+    return {"id": offer_id, "cancelled_entry_id": entry['id'], "details": offer_details, "course_name": entry['course'].course_name,
+            "group": entry['group'], "students": entry['students'], "slot": entry['slot'], "offered_to_teacher_id": teacher_id}
+
+
+def save_cancellation_request(Session, entry_id, teacher_id, snapshot=None):
+    with Session() as db_session, db_session.begin():
+        data_version = _advance_timetable(db_session, snapshot)
+        cancellation = CancellationRequest(timetable_entry_id=entry_id, teacher_id=teacher_id, status='pending')
+        db_session.add(cancellation)
+        db_session.flush()
+        _log_change(db_session, data_version, 'request', {'request_id': cancellation.id, 'entry_id': entry_id})
+        return cancellation.id
+
+
+def resolve_cancellation_request(Session, request_id, action, cancelled_entry_id=None, substitute_teacher_ids=(), snapshot=None):
+    """Records the admin's decision; an approval cancels the entry and opens offers. Returns the offer ids."""
+    with Session() as db_session, db_session.begin():
+        data_version = _advance_timetable(db_session, snapshot)
+        db_session.query(CancellationRequest).filter_by(id=request_id).update({'status': f'{action}d'})
+        offers = []
+        if cancelled_entry_id is not None:
+            db_session.query(TimetableEntry).filter_by(id=cancelled_entry_id).update({'status': 'cancelled'})
+            offers = [SubstitutionOffer(cancelled_entry_id=cancelled_entry_id, offered_to_teacher_id=t, status='offered') for t in substitute_teacher_ids]
+            db_session.add_all(offers)
+            db_session.flush()
+        _log_change(db_session, data_version, 'resolve', {'request_id': request_id, 'cancelled_entry_id': cancelled_entry_id,
+                                                          'offers': [[offer.id, offer.offered_to_teacher_id] for offer in offers]})
+        return [offer.id for offer in offers]
+
+
+def save_substitution(Session, offer_id, cancelled_entry_id, teacher_id, snapshot=None):
+    """Adds the substitute's class to the cancelled entry's version and closes all offers for it. Returns the new entry id."""
+    with Session() as db_session, db_session.begin():
+        data_version = _advance_timetable(db_session, snapshot)
+        cancelled = db_session.get(TimetableEntry, cancelled_entry_id)
+        substitute = TimetableEntry(version_id=cancelled.version_id, course_id=cancelled.course_id, teacher_id=teacher_id,
+                                    room_id=cancelled.room_id, slot=cancelled.slot, group_name=cancelled.group_name,
+                                    cohort=cancelled.cohort, status='active')
+        db_session.add(substitute)
+        db_session.query(SubstitutionOffer).filter_by(cancelled_entry_id=cancelled_entry_id, status='offered').update({'status': 'withdrawn'})
+        db_session.query(SubstitutionOffer).filter_by(id=offer_id).update({'status': 'accepted'})
+        db_session.flush()
+        _log_change(db_session, data_version, 'substitute', {'cancelled_entry_id': cancelled_entry_id, 'entry_id': substitute.id, 'teacher_id': teacher_id})
+        return substitute.id
@@ -0,0 +1,127 @@
+from collections import Counter, defaultdict
+
+from storage import substitution_offer_view
+
+
+class SubstitutionEngine:
+    """
+    In-memory indexes behind class cancellations and substitutions, over the rows of the
+    published Timetable. Busy teachers are counted per slot and qualified teachers listed
+    per course name, both kept up to date as rows are cancelled and substitutes added, so
+    finding substitutes costs O(candidates). Pending cancellation requests are keyed by id
+    and open offers by id, by cancelled entry and by teacher, so approving, listing and
+    accepting never scan the timetable.
+
+    Like TimetableIndex, the nested containers are replaced rather than changed in place
+    (busy counts are copied per slot by copy()), so a copy() can be changed while readers
+    use the original.
+    """
+    def __init__(self, timetable=None, teachers=(), cancellation_requests=(), open_offers=()):
+        self.timetable = timetable
+        self.rows_by_id = {}
+        self.rows_by_teacher_slot = defaultdict(list)
+        self.busy_teachers = defaultdict(Counter)
+        self.set_teachers(teachers)
+        for row in timetable.active_rows() if timetable else ():
+            teacher_id, slot = timetable.teacher_id(row), timetable.slot[row]
+            self.rows_by_id[timetable.entry_id[row]] = row
+            self.rows_by_teacher_slot[teacher_id, slot].append(row)
+            self.busy_teachers[slot][teacher_id] += 1
+        self.cancellation_requests = {str(r['id']): r for r in cancellation_requests}
+        self.offers = {}
+        self.offers_by_entry = defaultdict(dict)
+        self.offers_by_teacher = defaultdict(dict)
+        self.cancelled_rows = {}
+        for row, offer_id, teacher_id in open_offers:
+            self.open_offers(row, [(offer_id, teacher_id)])
+
+    def copy(self, timetable):
+        """A copy over timetable, a copy of this engine's timetable, that can be changed without affecting this engine."""
+        new = object.__new__(SubstitutionEngine)
+        new.timetable = timetable
+        new.teachers_by_id, new.qualified_teachers = self.teachers_by_id, self.qualified_teachers
+        new.rows_by_id, new.rows_by_teacher_slot = dict(self.rows_by_id), defaultdict(list, self.rows_by_teacher_slot)
+        new.busy_teachers = defaultdict(Counter, {slot: Counter(busy) for slot, busy in self.busy_teachers.items()})
+        new.cancellation_requests, new.offers, new.cancelled_rows = dict(self.cancellation_requests), dict(self.offers), dict(self.cancelled_rows)
+        new.offers_by_entry, new.offers_by_teacher = defaultdict(dict, self.offers_by_entry), defaultdict(dict, self.offers_by_teacher)
+        return new
+
+    # --- Teachers and timetable rows ---
+    def set_teachers(self, teachers):
+        """Rebuilds the course -> qualified teachers index, e.g. after a teacher upload."""
+        self.teachers_by_id = {t.id: t for t in teachers}
+        self.qualified_teachers = defaultdict(list)
+        for teacher in teachers:
+            for subject in dict.fromkeys((teacher.first_preference, teacher.second_preference)):
+                if subject: self.qualified_teachers[subject].append(teacher.id)
+
+    def add_entry(self, row):
+        """Indexes a row added to the timetable."""
+        teacher_id, slot = self.timetable.teacher_id(row), self.timetable.slot[row]
+        self.rows_by_id[self.timetable.entry_id[row]] = row
+        self.rows_by_teacher_slot[teacher_id, slot] = [*self.rows_by_teacher_slot.get((teacher_id, slot), ()), row]
+        self.busy_teachers[slot][teacher_id] += 1
+
+    def cancel_entry(self, row):
+        """Marks a row cancelled in the timetable and drops it from the indexes."""
+        teacher_id, slot = self.timetable.teacher_id(row), self.timetable.slot[row]
+        self.timetable.active[row] = 0
+        del self.rows_by_id[self.timetable.entry_id[row]]
+        self.rows_by_teacher_slot[teacher_id, slot] = [r for r in self.rows_by_teacher_slot[teacher_id, slot] if r != row]
+        self.busy_teachers[slot][teacher_id] -= 1
+
+    def substitute(self, row, teacher, entry_id):
+        """Adds a copy of a cancelled row taught by teacher as entry_id; returns the new row."""
+        tt = self.timetable
+        new_row = tt.append(tt.course[row], tt.teacher_position(teacher), tt.room[row], tt.slot[row], tt.cohort[row], entry_id)
+        self.add_entry(new_row)
+        return new_row
+
+    def row_for_id(self, entry_id):
+        return self.rows_by_id.get(entry_id)
+
+    def entry_at(self, teacher_id, slot):
+        """The active row a teacher teaches in a slot (given by name), or None."""
+        rows = self.rows_by_teacher_slot.get((teacher_id, self.timetable.slot_index.get(slot))) if self.timetable else None
+        return rows[0] if rows else None
+
+    def substitutes_for(self, row):
+        """Teachers other than the row's own who can teach its course and are free in its slot."""
+        tt = self.timetable
+        busy, teacher_id = self.busy_teachers.get(tt.slot[row], Counter()), tt.teacher_id(row)
+        return [t for t in self.qualified_teachers.get(tt.courses[tt.course[row]].course_name, ())
+                if t != teacher_id and not busy[t]]
+
+    # --- Cancellation requests ---
+    def add_request(self, request_view):
+        self.cancellation_requests[str(request_view['id'])] = request_view
+
+    def pop_request(self, request_id):
+        return self.cancellation_requests.pop(str(request_id), None)
+
+    # --- Substitution offers ---
+    def open_offers(self, cancelled_row, offers):
+        """Records offers, given as (offer_id, teacher_id) pairs, to cover a cancelled row."""
+        entry = self.timetable.entry(cancelled_row)
+        self.cancelled_rows[entry['id']] = cancelled_row
+        for offer_id, teacher_id in offers:
+            view = substitution_offer_view(offer_id, entry, teacher_id)
+            self.offers[str(offer_id)] = view
+            self.offers_by_entry[entry['id']] = {**self.offers_by_entry.get(entry['id'], {}), str(offer_id): view}
+            self.offers_by_teacher[teacher_id] = {**self.offers_by_teacher.get(teacher_id, {}), str(offer_id): view}
+
+    def get_offer(self, offer_id):
+        return self.offers.get(str(offer_id))
+
+    def offers_for_teacher(self, teacher_id):
+        return list(self.offers_by_teacher.get(teacher_id, {}).values())
+
+    def close_offers(self, cancelled_entry_id):
+        """Withdraws every open offer for a cancelled entry and returns its row."""
+        for offer_id, view in self.offers_by_entry.pop(cancelled_entry_id, {}).items():
+            del self.offers[offer_id]
+            teacher_id = view['offered_to_teacher_id']
+            teacher_offers = {key: other for key, other in self.offers_by_teacher[teacher_id].items() if key != offer_id}
+            if teacher_offers: self.offers_by_teacher[teacher_id] = teacher_offers
+            else: del self.offers_by_teacher[teacher_id]
+        return self.cancelled_rows.pop(cancelled_entry_id, None)
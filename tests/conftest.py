@@ -0,0 +1,28 @@
+import os
+import sys
+
+# The modules live at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.synthetic import generate_dataset
+from models import Base, create_db_engine
+
+
+@pytest.fixture
+def Session(tmp_path):
+    """A session factory over a new SQLite database file with the app's tables."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'timetable.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def dataset(Session):
+    """The small synthetic dataset, saved in the Session database."""
+    dataset = generate_dataset('small')
+    with Session() as db_session: dataset.save(db_session)
+    return dataset
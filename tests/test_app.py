@@ -0,0 +1,63 @@
+import importlib
+import io
+import sys
+
+import pytest
+
+import timetable_store
+from benchmarks.synthetic import generate_dataset
+from solver import AntColonyTimetableSolver
+from storage import save_timetable
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """The app module, imported afresh over a new database in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'timetable.db'}")
+    monkeypatch.setenv('SOLVER_CACHE_DIR', str(tmp_path / 'solver_cache'))
+    monkeypatch.setattr(timetable_store, 'TIMETABLE_RECHECK_SECONDS', 0)
+    sys.modules.pop('app', None)
+    module = importlib.import_module('app')
+    yield module
+    module.engine.dispose()
+    sys.modules.pop('app', None)
+
+
+@pytest.fixture
+def published(app_module):
+    """The small synthetic dataset with a published timetable, in the app's database."""
+    dataset = generate_dataset('small')
+    with app_module.Session() as db_session: dataset.save(db_session)
+    timetable = AntColonyTimetableSolver(*dataset.solver_args(), seed=1, num_iterations=1).solve()
+    app_module.TIMETABLES.publish(timetable, dataset.teachers,
+                                  lambda snapshot: save_timetable(app_module.Session, timetable, 0, 1, snapshot))
+    return dataset, timetable
+
+
+def test_room_upload_renames_rooms_in_the_published_timetable(app_module, published):
+    dataset, timetable = published
+    student_id = next(student_id for students in timetable.cohort_students for student_id in students)
+    client = app_module.app.test_client()
+    before = client.get('/api/student/timetable', query_string={'student_id': student_id}).get_json()['timetable']
+    room_names = {entry['room_name'] for entry in before}
+
+    rooms = ''.join(f"{room.id},{'Renamed ' + room.location if room.location in room_names else room.location},{room.capacity}\n"
+                    for room in dataset.classrooms)
+    response = client.post('/api/admin/upload/classrooms', query_string={'mode': 'upsert'},
+                           data={'file': (io.BytesIO(f"id,location,capacity\n{rooms}".encode()), 'classrooms.csv')})
+    assert response.status_code == 201
+
+    after = client.get('/api/student/timetable', query_string={'student_id': student_id}).get_json()['timetable']
+    assert [entry['room_name'] for entry in after] == ['Renamed ' + entry['room_name'] for entry in before]
+
+
+@pytest.mark.parametrize('weeks', ['0', '-1', '1.5', 'ten', ''])
+def test_calendar_export_refuses_weeks_below_one(app_module, published, weeks):
+    response = app_module.app.test_client().get('/api/admin/export/timetable', query_string={'format': 'ics', 'weeks': weeks})
+    assert response.status_code == 400
+
+
+def test_calendar_export_repeats_events_for_weeks(app_module, published):
+    response = app_module.app.test_client().get('/api/admin/export/timetable', query_string={'format': 'ics', 'weeks': '3'})
+    assert response.status_code == 200 and 'COUNT=3' in response.get_data(as_text=True)
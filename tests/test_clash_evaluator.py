@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from benchmarks.synthetic import generate_dataset
+from solver import AntColonyTimetableSolver
+
+
+def reference_clashes(solver, timetable):
+    """The original set-based count: every repeat of a (teacher, slot), (room, slot) or (student, slot) is one violation."""
+    violations = 0
+    teacher_slots, room_slots, student_slots = set(), set(), set()
+    for c, t, r, slot, g in timetable:
+        if (t, slot) in teacher_slots: violations += 1
+        teacher_slots.add((t, slot))
+        if (r, slot) in room_slots: violations += 1
+        room_slots.add((r, slot))
+        for student_id in solver._entry_students(g, c):
+            if (student_id, slot) in student_slots: violations += 1
+            student_slots.add((student_id, slot))
+    return violations
+
+
+def perturbed_timetables(solver, count, seed):
+    """Ant timetables with teacher, room and student (same group, same slot) clashes injected at random."""
+    rng = random.Random(seed)
+    timetables = []
+    for _ in range(count):
+        timetable = solver._construct_solution_for_ant(rng=rng)
+        for _ in range(rng.randint(1, 12)):
+            i, j = rng.randrange(len(timetable)), rng.randrange(len(timetable))
+            c, t, r, slot, g = timetable[i]
+            other = timetable[j]
+            kind = rng.choice(('teacher', 'room', 'student'))
+            if kind == 'teacher': timetable[i] = (c, other[1], r, other[3], g)
+            elif kind == 'room': timetable[i] = (c, t, other[2], other[3], g)
+            else:
+                same_group = [e for e in timetable if e[4] == g and e is not timetable[i]]
+                if same_group: timetable[i] = (c, t, r, rng.choice(same_group)[3], g)
+        timetables.append(timetable)
+    return timetables
+
+
+@pytest.mark.parametrize('preset', ['small', 'medium'])
+def test_batch_count_matches_reference(preset):
+    solver = AntColonyTimetableSolver(*generate_dataset(preset).solver_args(), seed=0, local_search_passes=0)
+    timetables = perturbed_timetables(solver, 25, seed=len(preset))
+    expected = [reference_clashes(solver, timetable) for timetable in timetables]
+    assert solver._check_clashes_batch(timetables).tolist() == expected
+    assert [solver._check_clashes(timetable) for timetable in timetables] == expected
+    assert any(expected)
+
+
+# Without cross-program teaching the small college splits into two components, solved in parallel with 2 workers.
+@pytest.mark.parametrize('cross_program_teaching', [1.0, 0.0])
+def test_seeded_solve_is_independent_of_worker_count(cross_program_teaching):
+    results = []
+    for workers in (1, 2):
+        dataset = generate_dataset('small', cross_program_teaching=cross_program_teaching)
+        solver = AntColonyTimetableSolver(*dataset.solver_args(), seed=7, num_workers=workers, num_iterations=3)
+        solver.solve(target_score=None)
+        results.append((sorted(solver.best_timetable), solver.best_timetable_score))
+    assert results[0] == results[1]
@@ -0,0 +1,57 @@
+import threading
+import time
+
+import jobs
+from jobs import CANCELLED, FAILED, RUNNING, SUCCEEDED, JobManager
+from models import GenerationJobRecord
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_workers_share_jobs(Session, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_SYNC_INTERVAL', 0.02)
+    started = threading.Event()
+
+    def run_job(job):
+        started.set()
+        for iteration in range(500):
+            if job.should_stop(): return None
+            job.update_progress({"iteration": iteration, "iterations": 500, "best_score": 1000})
+            time.sleep(0.01)
+
+    first, second = JobManager(run_job, Session), JobManager(run_job, Session)
+    job, created = first.submit(1, {"seed": 1})
+    assert created and started.wait(5)
+
+    # The other worker finds the running job instead of starting a second one for the version.
+    same, created = second.submit(1, {})
+    assert not created and same.id == job.id and same.status == RUNNING
+    wait_for(lambda: second.get(job.id).to_dict()["iteration"])
+    assert second.latest().id == job.id
+
+    # ... and can cancel it.
+    assert second.cancel(job.id).id == job.id
+    wait_for(lambda: second.get(job.id).status == CANCELLED)
+    assert job.status == CANCELLED
+
+    # Once it has finished, the version is free again.
+    again, created = second.submit(1, {})
+    assert created and again.id != job.id
+    second.cancel(again.id)
+    wait_for(lambda: first.get(again.id).status == CANCELLED)
+
+
+def test_jobs_of_a_stopped_worker_do_not_hold_their_version(Session):
+    stale = time.time() - jobs.JOB_STALE_AFTER - 1
+    with Session() as db_session, db_session.begin():
+        db_session.add(GenerationJobRecord(id='lost', dataset_version=1, status=RUNNING, created_at=stale, heartbeat_at=stale))
+
+    manager = JobManager(lambda job: None, Session)
+    job, created = manager.submit(1, {})
+    assert created and manager.get('lost').status == FAILED
+    wait_for(lambda: manager.get(job.id).status == SUCCEEDED)
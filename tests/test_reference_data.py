@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+from sqlalchemy import Float, Integer
+
+from models import StudentElective
+from reference_cache import REFERENCE_MODELS, ReferenceCache
+from reference_data import REFERENCE_COLUMNS
+
+
+def test_caches_reload_after_another_process_writes(Session, dataset):
+    first, second = ReferenceCache(Session), ReferenceCache(Session)
+    student_id = dataset.students[0].id
+    before = second.get()
+    assert second.get() is before
+
+    with Session() as db_session, db_session.begin():
+        db_session.query(StudentElective).filter_by(student_id=student_id).delete()
+        first.invalidate(db_session)
+    after = second.get()
+    assert after.version == first.version == before.version + 1
+    assert student_id in before.electives_by_student and student_id not in after.electives_by_student
+
+    # A rolled-back change leaves the version, and every cached snapshot, as it was.
+    with Session() as db_session:
+        first.invalidate(db_session)
+        db_session.rollback()
+    assert second.get() is after
+
+
+def test_record_columns_match_the_models():
+    for name, model in REFERENCE_MODELS.items():
+        assert REFERENCE_COLUMNS[name] == tuple((c.name, int if isinstance(c.type, Integer) else float if isinstance(c.type, Float) else str)
+                                                for c in model.__table__.columns)
+
+
+def test_csv_datasets_load_without_sqlalchemy():
+    subprocess.run([sys.executable, '-c', "import sys, reference_data; assert 'sqlalchemy' not in sys.modules"],
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
@@ -0,0 +1,30 @@
+from reference_cache import ReferenceCache
+from result_cache import ResultCache, cacheable, solver_fingerprint
+from solver import AntColonyTimetableSolver, DEFAULT_CONSTRAINTS
+
+
+def test_cacheable_results():
+    assert cacheable(1, 0, 172000)
+    assert cacheable(None, 0, 0)
+    assert not cacheable(None, 0, 1000)
+    assert not cacheable(None, None, 0)
+
+
+def test_seeded_results_stopped_by_the_time_budget_are_not_cacheable():
+    assert not cacheable(1, 0, 172000, time_budget=1, stop_reason='time_budget')
+    assert cacheable(1, 0, 0, time_budget=1, stop_reason='time_budget')
+    assert cacheable(1, 0, 172000, time_budget=1, stop_reason='patience')
+
+
+def test_round_trip_creates_the_directory_on_first_put(tmp_path, Session, dataset):
+    reference = ReferenceCache(Session).get()
+    cache = ResultCache(tmp_path / 'solver_cache')
+    fingerprint = solver_fingerprint(reference, DEFAULT_CONSTRAINTS, {'seed': 1})
+    assert fingerprint == solver_fingerprint(ReferenceCache(Session).get(), DEFAULT_CONSTRAINTS, {'seed': 1})
+    assert not (tmp_path / 'solver_cache').exists() and cache.get(fingerprint, reference) is None
+
+    timetable = AntColonyTimetableSolver(*reference.solver_args(), dict(DEFAULT_CONSTRAINTS), seed=1, num_iterations=1).solve()
+    cache.put(fingerprint, timetable, 0, 'target_score')
+    stored, best_score, stop_reason = cache.get(fingerprint, reference)
+    assert (best_score, stop_reason) == (0, 'target_score')
+    assert [stored.entry(row)['slot'] for row in range(len(stored))] == [timetable.entry(row)['slot'] for row in timetable.active_rows()]
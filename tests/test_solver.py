@@ -0,0 +1,50 @@
+import numpy as np
+
+from benchmarks.synthetic import generate_dataset
+from solver import AntColonyTimetableSolver, CORE_BLOCK, PHEROMONE_MIN
+
+
+def test_pheromone_trails_diverge():
+    """Without repair the colony is steered by its trails alone, so they must move well away from uniform."""
+    solver = AntColonyTimetableSolver(*generate_dataset('small').solver_args(), seed=1, local_search_passes=0,
+                                      num_iterations=30, decompose=False)
+    solver.solve(target_score=None)
+    trails = solver.pheromone_trails
+    used = trails.max(axis=1) > PHEROMONE_MIN
+    assert (trails[used].max(axis=1) / trails[used].min(axis=1)).min() > 5
+    assert np.isclose(trails.min(), PHEROMONE_MIN)
+
+
+def test_failed_placements_count_unplaced_periods():
+    """Every period construction leaves out is counted once, however many slots it was tried in."""
+    dataset = generate_dataset('medium', teachers_per_course=1, room_ratio=0.5)
+    solver = AntColonyTimetableSolver(*dataset.solver_args(), seed=3, local_search_passes=0)
+    demand = sum(1 for kind, _g, _c in solver.scheduling_blocks if kind == CORE_BLOCK) + sum(map(len, solver.group_elective_demand))
+    for _ in range(3):
+        before = sum(solver.metrics.failed_placements.values())
+        timetable = solver._construct_solution_for_ant()
+        failed = sum(solver.metrics.failed_placements.values()) - before
+        assert failed == demand - len(timetable) > 0
+
+
+def test_component_histories_are_kept_per_component():
+    dataset = generate_dataset('small', cross_program_teaching=0.0)
+    solver = AntColonyTimetableSolver(*dataset.solver_args(), seed=1, num_iterations=3)
+    solver.solve(target_score=None)
+    history = solver.metrics.to_dict()
+    assert history['best_score_history'] == []
+    assert history['failed_placements']['no_slot'] == 0
+    assert sorted(history['component_score_history']) == [1, 2]
+    for component_history in history['component_score_history'].values():
+        assert [iteration for iteration, _score, _elapsed in component_history] == [1, 2, 3]
+
+
+def test_pruned_entries_leave_the_demand_feasible():
+    dataset = generate_dataset('small')
+    names = {dataset.courses[0].course_name}
+    teachers = [t for t in dataset.teachers if t.first_preference not in names and t.second_preference not in names]
+    solver = AntColonyTimetableSolver(dataset.courses, teachers, *dataset.solver_args()[2:], seed=1, num_iterations=1)
+    report = solver.feasibility
+    assert report['feasible'] and report['unplaceable_periods'] > 0
+    assert [course['issues'] for course in report['courses'] if course['course_name'] in names] == [['no_teacher']]
+    assert len(solver.solve()) == report['demand_periods'] - report['unplaceable_periods']
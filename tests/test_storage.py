@@ -0,0 +1,22 @@
+from sqlalchemy import select
+
+from models import TimetableEntry
+from solver import AntColonyTimetableSolver
+from storage import resolve_cancellation_request, save_substitution, save_timetable
+
+
+def test_entry_ids_come_from_the_database(Session, dataset):
+    timetable = AntColonyTimetableSolver(*dataset.solver_args(), seed=1, num_iterations=1).solve()
+
+    save_timetable(Session, timetable, 0, 1)
+    first_ids = timetable.entry_id.tolist()
+    save_timetable(Session, timetable, 0, 1)
+    with Session() as db_session:
+        stored = dict(db_session.execute(select(TimetableEntry.id, TimetableEntry.slot)).all())
+    assert len(set(first_ids + timetable.entry_id.tolist())) == 2 * len(timetable)
+    assert all(stored[entry_id] == timetable.slots[timetable.slot[row]] for row, entry_id in enumerate(timetable.entry_id))
+
+    # A substitute inserted by the ORM afterwards gets a fresh id.
+    entry_id = timetable.entry_id[0]
+    offer_ids = resolve_cancellation_request(Session, 0, 'approve', entry_id, [timetable.teacher_id(1)])
+    assert save_substitution(Session, offer_ids[0], entry_id, timetable.teacher_id(1)) > max(timetable.entry_id)
@@ -0,0 +1,57 @@
+import threading
+
+import timetable_store
+from reference_cache import ReferenceCache
+from solver import AntColonyTimetableSolver
+from storage import save_cancellation_request, save_timetable
+from timetable_store import TimetableStore
+
+
+def request_cancellation(Session, row):
+    def change(draft):
+        entry = draft.timetable.entry(row)
+        draft.add_request(save_cancellation_request(Session, entry['id'], entry['teacher'].id, snapshot=draft), row)
+    return change
+
+
+def test_workers_replay_each_others_changes(Session, dataset, monkeypatch):
+    monkeypatch.setattr(timetable_store, 'TIMETABLE_RECHECK_SECONDS', 0)
+    first, second = (TimetableStore(Session, ReferenceCache(Session)) for _ in range(2))
+    assert first.get().timetable is None and second.get().timetable is None
+
+    timetable = AntColonyTimetableSolver(*dataset.solver_args(), seed=1, num_iterations=1).solve()
+    first.publish(timetable, dataset.teachers, lambda snapshot: save_timetable(Session, timetable, 0, 1, snapshot))
+    loaded = second.get()
+    assert loaded.version == first.get().version and loaded.revision == 0
+    assert len(loaded.timetable) == len(timetable)
+
+    # The writer keeps its own draft; the other worker replays the logged change onto a draft of its snapshot.
+    first.update(request_cancellation(Session, 0))
+    published = first.get()
+    assert len(published.substitutions.cancellation_requests) == 1 and published.revision == 2
+    replayed = second.get()
+    assert replayed.revision == 1 and len(replayed.substitutions.cancellation_requests) == 1
+    assert len(loaded.substitutions.cancellation_requests) == 0
+
+    # A write racing another worker's fails on the stale snapshot and is retried on the current one.
+    drafts = []
+    def racing(draft):
+        if not drafts: first.update(request_cancellation(Session, 1))
+        drafts.append(draft)
+        return request_cancellation(Session, 2)(draft)
+    second.update(racing)
+    assert len(drafts) == 2
+    assert len(second.get().substitutions.cancellation_requests) == 3
+    assert len(first.get().substitutions.cancellation_requests) == 3
+
+
+def test_readers_keep_the_snapshot_while_another_thread_refreshes(Session, dataset, monkeypatch):
+    monkeypatch.setattr(timetable_store, 'TIMETABLE_RECHECK_SECONDS', 0)
+    store = TimetableStore(Session, ReferenceCache(Session))
+    snapshot = store.get()
+    with store._lock:
+        result = []
+        reader = threading.Thread(target=lambda: result.append(store.get()))
+        reader.start()
+        reader.join(timeout=5)
+        assert result == [snapshot]
@@ -0,0 +1,102 @@
+from array import array
+
+
+def cohort_key(course, group):
+    """Core classes are attended by the whole group; electives by the group's students enrolled in the course."""
+    if course.course_type == 'Major': return group
+    return f"{group}:{course.id}"
+
+
+class Timetable:
+    """
+    A timetable as parallel integer columns, one row per entry. course, teacher and room
+    index the lookup lists the timetable was built with, slot indexes slots, and cohort
+    indexes the cohort table, which holds each cohort's key, group and students once for
+    all of its rows. entry_id is the database id once saved (0 before) and active is
+    cleared when a class is cancelled. Rows are expanded into entry dicts only at the
+    JSON boundary, see entry().
+    """
+    def __init__(self, courses, teachers, rooms, slots=()):
+        self.courses, self.teachers, self.rooms, self.slots = list(courses), list(teachers), list(rooms), list(slots)
+        self.course_index = {c.id: i for i, c in enumerate(self.courses)}
+        self.teacher_index = {t.id: i for i, t in enumerate(self.teachers)}
+        self.room_index = {r.id: i for i, r in enumerate(self.rooms)}
+        self.slot_index = {slot: i for i, slot in enumerate(self.slots)}
+        self.course, self.teacher, self.room, self.slot, self.cohort = (array('i') for _ in range(5))
+        self.entry_id = array('q')
+        self.active = bytearray()
+        self.cohort_keys, self.cohort_groups, self.cohort_students = [], [], []
+        self.cohort_index = {}
+
+    def __len__(self):
+        return len(self.course)
+
+    def copy(self):
+        """An independent copy of the rows and lookups; lookup records and cohort student lists are shared."""
+        new = object.__new__(Timetable)
+        new.courses, new.teachers, new.rooms, new.slots = self.courses[:], self.teachers[:], self.rooms[:], self.slots[:]
+        new.course_index, new.teacher_index, new.room_index, new.slot_index = (
+            dict(self.course_index), dict(self.teacher_index), dict(self.room_index), dict(self.slot_index))
+        new.course, new.teacher, new.room, new.slot, new.cohort = self.course[:], self.teacher[:], self.room[:], self.slot[:], self.cohort[:]
+        new.entry_id, new.active = self.entry_id[:], self.active[:]
+        new.cohort_keys, new.cohort_groups, new.cohort_students = self.cohort_keys[:], self.cohort_groups[:], self.cohort_students[:]
+        new.cohort_index = dict(self.cohort_index)
+        return new
+
+    # --- Lookups ---
+    def teacher_position(self, teacher):
+        """Index of a teacher record, adding it if the timetable has not seen it (e.g. a substitute)."""
+        t = self.teacher_index.get(teacher.id)
+        if t is None:
+            t = self.teacher_index[teacher.id] = len(self.teachers)
+            self.teachers.append(teacher)
+        return t
+
+    def slot_position(self, slot):
+        s = self.slot_index.get(slot)
+        if s is None:
+            s = self.slot_index[slot] = len(self.slots)
+            self.slots.append(slot)
+        return s
+
+    def add_cohort(self, key, group, students):
+        """Index of the cohort with this key; students are stored the first time it is seen."""
+        k = self.cohort_index.get(key)
+        if k is None:
+            k = self.cohort_index[key] = len(self.cohort_keys)
+            self.cohort_keys.append(key)
+            self.cohort_groups.append(group)
+            self.cohort_students.append(students)
+        return k
+
+    # --- Rows ---
+    def append(self, course, teacher, room, slot, cohort, entry_id=0, active=True):
+        """Adds a row from lookup indexes and returns its position."""
+        self.course.append(course); self.teacher.append(teacher); self.room.append(room)
+        self.slot.append(slot); self.cohort.append(cohort)
+        self.entry_id.append(entry_id)
+        self.active.append(1 if active else 0)
+        return len(self.course) - 1
+
+    def active_rows(self):
+        return [i for i, active in enumerate(self.active) if active]
+
+    def group(self, row):
+        return self.cohort_groups[self.cohort[row]]
+
+    def students(self, row):
+        return self.cohort_students[self.cohort[row]]
+
+    def teacher_id(self, row):
+        return self.teachers[self.teacher[row]].id
+
+    def entry(self, row):
+        """The row as the entry dict used by views and the API: lookup records, slot name, group and students."""
+        cohort = self.cohort[row]
+        return {'id': self.entry_id[row], 'course': self.courses[self.course[row]], 'teacher': self.teachers[self.teacher[row]],
+                'group': self.cohort_groups[cohort], 'students': self.cohort_students[cohort], 'room': self.rooms[self.room[row]],
+                'slot': self.slots[self.slot[row]], 'cohort': self.cohort_keys[cohort]}
+
+    def entries(self):
+        """Entry dicts of the active rows."""
+        return (self.entry(row) for row in self.active_rows())
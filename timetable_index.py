@@ -0,0 +1,103 @@
+import hashlib
+import json
+from collections import defaultdict
+
+# --- Constants ---
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+PERIODS_PER_DAY = 8
+TEACHER_WEEKLY_HOURS = 20
+
+
+class TimetableIndex:
+    """
+    Per-student and per-teacher lookup over the rows of a published Timetable. Students map
+    to the cohorts they belong to and cohorts to their rows, so building the index costs
+    one pass over cohort memberships. Serialized responses are cached per id together with
+    an ETag derived from the timetable version and the response body.
+
+    Once built, the lists and sets in the index are never changed in place: add_entry and
+    remove_entry replace them, so a copy() can be changed while readers use the original.
+    """
+    def __init__(self, timetable, version):
+        self.timetable = timetable
+        self.version = version
+        self.rows_by_teacher = defaultdict(list)
+        self.rows_by_cohort = defaultdict(list)
+        self.student_cohorts = defaultdict(set)
+        self._student_cache, self._teacher_cache = {}, {}
+        for row in timetable.active_rows() if timetable else ():
+            self.rows_by_teacher[timetable.teacher_id(row)].append(row)
+            self.rows_by_cohort[timetable.cohort[row]].append(row)
+        for cohort in self.rows_by_cohort:
+            for student_id in timetable.cohort_students[cohort]: self.student_cohorts[student_id].add(cohort)
+
+    def copy(self, timetable):
+        """A copy over timetable, a copy of this index's timetable, that can be changed without affecting this index."""
+        new = object.__new__(TimetableIndex)
+        new.timetable, new.version = timetable, self.version
+        new.rows_by_teacher = defaultdict(list, self.rows_by_teacher)
+        new.rows_by_cohort = defaultdict(list, self.rows_by_cohort)
+        new.student_cohorts = defaultdict(set, self.student_cohorts)
+        new._student_cache, new._teacher_cache = dict(self._student_cache), dict(self._teacher_cache)
+        return new
+
+    def add_entry(self, row):
+        teacher_id, cohort = self.timetable.teacher_id(row), self.timetable.cohort[row]
+        self.rows_by_teacher[teacher_id] = [*self.rows_by_teacher.get(teacher_id, ()), row]
+        if not self.rows_by_cohort.get(cohort):
+            for student_id in self.timetable.cohort_students[cohort]:
+                self.student_cohorts[student_id] = self.student_cohorts.get(student_id, set()) | {cohort}
+        self.rows_by_cohort[cohort] = [*self.rows_by_cohort.get(cohort, ()), row]
+        self._invalidate(row)
+
+    def remove_entry(self, row):
+        teacher_id, cohort = self.timetable.teacher_id(row), self.timetable.cohort[row]
+        self.rows_by_teacher[teacher_id] = [r for r in self.rows_by_teacher[teacher_id] if r != row]
+        self.rows_by_cohort[cohort] = [r for r in self.rows_by_cohort[cohort] if r != row]
+        self._invalidate(row)
+
+    def _invalidate(self, row):
+        self._teacher_cache.pop(self.timetable.teacher_id(row), None)
+        for student_id in self.timetable.students(row): self._student_cache.pop(student_id, None)
+
+    def student_rows(self, student_id):
+        return [row for cohort in self.student_cohorts.get(student_id, ()) for row in self.rows_by_cohort.get(cohort, ())]
+
+    def teacher_rows(self, teacher_id):
+        return self.rows_by_teacher.get(teacher_id, [])
+
+    def student_response(self, student_id):
+        """Returns (json_body, etag) for a student's timetable, cached until one of their entries changes."""
+        cached = self._student_cache.get(student_id)
+        if cached: return cached
+        tt, schedule = self.timetable, []
+        for row in self.student_rows(student_id):
+            day, period = tt.slots[tt.slot[row]].split('_')
+            schedule.append({
+                "day": day, "period": int(period), "course_name": tt.courses[tt.course[row]].course_name,
+                "teacher_name": tt.teacher_id(row), "room_name": tt.rooms[tt.room[row]].location,
+            })
+        rendered = self._render({"timetable": schedule, "days": DAYS, "periods": PERIODS_PER_DAY})
+        if student_id in self.student_cohorts: self._student_cache[student_id] = rendered
+        return rendered
+
+    def teacher_response(self, teacher_id):
+        """Returns (json_body, etag) for a teacher's timetable, cached until one of their entries changes."""
+        cached = self._teacher_cache.get(teacher_id)
+        if cached: return cached
+        tt, schedule = self.timetable, []
+        for row in self.teacher_rows(teacher_id):
+            day, period = tt.slots[tt.slot[row]].split('_')
+            schedule.append({
+                "day": day, "period": int(period), "course_name": tt.courses[tt.course[row]].course_name,
+                "group": tt.group(row),
+                "students": tt.students(row),
+                "room_name": tt.rooms[tt.room[row]].location,
+            })
+        rendered = self._render({"timetable": schedule, "days": DAYS, "periods": PERIODS_PER_DAY, "workload": TEACHER_WEEKLY_HOURS - len(schedule)})
+        if teacher_id in self.rows_by_teacher: self._teacher_cache[teacher_id] = rendered
+        return rendered
+
+    def _render(self, payload):
+        body = json.dumps(payload, sort_keys=True)
+        return body, f"v{self.version}-{hashlib.md5(body.encode()).hexdigest()[:16]}"
@@ -0,0 +1,142 @@
+import threading
+import time
+
+from models import TIMETABLE_DATA_VERSION, read_data_version
+from storage import StaleTimetableError, cancellation_request_view, load_published_timetable, load_timetable_changes
+from substitution import SubstitutionEngine
+from timetable_index import TimetableIndex
+
+# --- Constants ---
+# Seconds a snapshot is served before a reader checks the database for other processes' writes.
+TIMETABLE_RECHECK_SECONDS = 1.0
+
+
+class TimetableSnapshot:
+    """
+    The published timetable together with its TimetableIndex and SubstitutionEngine, as
+    one consistent view. version is the database version of the timetable, data_version
+    the shared timetable data version it reflects and revision counts every change the
+    store has published. Once published a snapshot is never changed (the indexes only
+    memoize rendered responses), so a reader can use it for a whole request while writers
+    move on.
+    """
+    def __init__(self, version, revision, timetable, index, substitutions, data_version=0):
+        self.version, self.revision, self.data_version = version, revision, data_version
+        self.timetable, self.index, self.substitutions = timetable, index, substitutions
+
+    def draft(self):
+        """A copy with the next revision for a writer to change."""
+        timetable = self.timetable.copy() if self.timetable is not None else None
+        return TimetableSnapshot(self.version, self.revision + 1, timetable,
+                                 self.index.copy(timetable), self.substitutions.copy(timetable), self.data_version)
+
+    # --- Changes, made by the writer and replayed by other processes ---
+    def add_request(self, request_id, row):
+        self.substitutions.add_request(cancellation_request_view(request_id, self.timetable.entry(row)))
+
+    def resolve_request(self, request_id, cancelled_row=None, offers=()):
+        """Drops a request; an approval cancels its row and opens offers, given as (offer_id, teacher_id) pairs."""
+        self.substitutions.pop_request(request_id)
+        if cancelled_row is None: return
+        self.substitutions.cancel_entry(cancelled_row)
+        self.index.remove_entry(cancelled_row)
+        if offers: self.substitutions.open_offers(cancelled_row, offers)
+
+    def substitute(self, cancelled_entry_id, teacher, entry_id):
+        """Closes the offers for a cancelled entry and adds its class taught by teacher as entry_id."""
+        cancelled_row = self.substitutions.close_offers(cancelled_entry_id)
+        self.index.add_entry(self.substitutions.substitute(cancelled_row, teacher, entry_id))
+
+    def replay(self, kind, payload):
+        """Applies a change logged by storage; False if it does not fit this snapshot, which must then be reloaded."""
+        substitutions = self.substitutions
+        if self.timetable is None: return False
+        if kind == 'request':
+            row = substitutions.row_for_id(payload['entry_id'])
+            if row is None: return False
+            self.add_request(payload['request_id'], row)
+        elif kind == 'resolve':
+            cancelled_row = None
+            if payload['cancelled_entry_id'] is not None:
+                cancelled_row = substitutions.row_for_id(payload['cancelled_entry_id'])
+                if cancelled_row is None: return False
+            self.resolve_request(payload['request_id'], cancelled_row, [tuple(offer) for offer in payload['offers']])
+        elif kind == 'substitute':
+            teacher = substitutions.teachers_by_id.get(payload['teacher_id'])
+            if teacher is None or payload['cancelled_entry_id'] not in substitutions.cancelled_rows: return False
+            self.substitute(payload['cancelled_entry_id'], teacher, payload['entry_id'])
+        else:
+            return False
+        return True
+
+
+class TimetableStore:
+    """Serves the current TimetableSnapshot without blocking readers; writers swap in changed drafts one at a time."""
+    def __init__(self, Session, reference_cache):
+        self._Session = Session
+        self._reference_cache = reference_cache
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._next_check = 0.0
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None: self._refresh()
+                return self._snapshot
+        # The reader that finds the snapshot due catches it up; meanwhile the others keep serving it.
+        if time.monotonic() >= self._next_check and self._lock.acquire(blocking=False):
+            try: self._refresh()
+            finally: self._lock.release()
+            return self._snapshot
+        return snapshot
+
+    def update(self, change):
+        """Calls change(draft), which does the database writes, and publishes the draft; returns change's result."""
+        with self._lock:
+            try:
+                self._refresh()
+                draft = self._snapshot.draft()
+                result = change(draft)
+            except StaleTimetableError:
+                # Another process wrote between the refresh and the write: retry on its changes.
+                self._refresh()
+                draft = self._snapshot.draft()
+                result = change(draft)
+            self._snapshot = draft
+            return result
+
+    def publish(self, timetable, teachers, save):
+        """Swaps in a newly generated timetable, saved by save(snapshot); returns its version id."""
+        with self._lock:
+            revision = self._snapshot.revision + 1 if self._snapshot is not None else 1
+            snapshot = TimetableSnapshot(None, revision, timetable, None, None)
+            snapshot.version = save(snapshot)
+            snapshot.index, snapshot.substitutions = TimetableIndex(timetable, snapshot.version), SubstitutionEngine(timetable, teachers)
+            self._snapshot = snapshot
+            return snapshot.version
+
+    def _refresh(self):
+        """Catches the snapshot up with the database, replaying logged changes onto a draft when it can; called with the lock held."""
+        self._next_check = time.monotonic() + TIMETABLE_RECHECK_SECONDS
+        snapshot = self._snapshot
+        if snapshot is not None:
+            data_version, changes = load_timetable_changes(self._Session, snapshot.data_version)
+            if data_version == snapshot.data_version: return
+            if changes is not None:
+                draft = snapshot.draft()
+                if all(draft.replay(kind, payload) for kind, payload in changes):
+                    draft.data_version = data_version
+                    self._snapshot = draft
+                    return
+        self._snapshot = self._load()
+
+    def _load(self):
+        with self._Session() as db_session:
+            # Read first: a change committed during the load is replayed again, which the next refresh then catches.
+            data_version = read_data_version(db_session, TIMETABLE_DATA_VERSION)
+        reference = self._reference_cache.get()
+        version, timetable, cancellation_requests, open_offers = load_published_timetable(self._Session, reference)
+        return TimetableSnapshot(version, 0, timetable, TimetableIndex(timetable, version),
+                                 SubstitutionEngine(timetable, reference.teachers, cancellation_requests, open_offers), data_version)
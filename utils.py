@@ -1,40 +1,96 @@
-import pandas as pd
-from pandas.errors import EmptyDataError
+from sqlalchemy import Float, Integer, and_, bindparam, select
 
-def load_csv_to_db(file_path, db_model, db_session):
+# --- Constants ---
+CSV_CHUNK_SIZE = 5000
+INGEST_MODES = ('replace', 'upsert', 'diff')
+# Natural keys for tables whose primary key is a surrogate id not present in the CSV.
+NATURAL_KEYS = {
+    'student_electives': ('student_id', 'course_id'),
+    'feedback': ('student_id', 'teacher_id', 'course_id'),
+}
+
+def _csv_dtypes(table):
+    """Explicit pandas dtypes from the table's column types, so chunks never need type inference."""
+    dtypes = {}
+    for column in table.columns:
+        if isinstance(column.type, Integer): dtypes[column.name] = 'Int64'
+        elif isinstance(column.type, Float): dtypes[column.name] = 'Float64'
+        else: dtypes[column.name] = 'string'
+    return dtypes
+
+def _iter_csv_records(source, table, chunksize):
+    """Yields lists of row dicts, one chunk at a time, with missing values as None."""
+    # Imported here so that importing this module does not pay for pandas.
+    import pandas as pd
+    from pandas.errors import EmptyDataError
+    dtypes = _csv_dtypes(table)
+    try:
+        reader = pd.read_csv(source, dtype=dtypes, usecols=lambda name: name in dtypes, chunksize=chunksize)
+        for chunk in reader:
+            yield chunk.astype(object).where(chunk.notna(), None).to_dict(orient='records')
+    except EmptyDataError:
+        return
+
+def ingest_csv(source, db_model, connection, mode='replace', chunksize=CSV_CHUNK_SIZE):
+    """
+    Streams a CSV into db_model's table in chunks using Core executemany on the given
+    connection; the caller owns the transaction. Modes:
+      replace - delete every row, then insert the file (the original behaviour)
+      upsert  - insert new rows and update changed ones, keyed by natural id
+      diff    - like upsert, and also delete rows that are missing from the file
+    Returns counts of inserted, updated, deleted and unchanged rows.
+    """
+    if mode not in INGEST_MODES: raise ValueError(f"Unknown ingest mode '{mode}'.")
+    table = db_model.__table__
+    stats = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    if mode == 'replace':
+        stats["deleted"] = connection.execute(table.delete()).rowcount
+        for records in _iter_csv_records(source, table, chunksize):
+            connection.execute(table.insert(), records)
+            stats["inserted"] += len(records)
+        return stats
+
+    key_columns = NATURAL_KEYS.get(table.name) or tuple(c.name for c in table.primary_key.columns)
+    value_columns = [c.name for c in table.columns if c.name not in key_columns and not c.primary_key]
+    existing = {tuple(row[:len(key_columns)]): tuple(row[len(key_columns):])
+                for row in connection.execute(select(*[table.c[name] for name in key_columns + tuple(value_columns)]))}
+    key_match = and_(*[table.c[name] == bindparam(f'key_{name}') for name in key_columns])
+    update = table.update().where(key_match).values({name: bindparam(name) for name in value_columns})
+    seen = set()
+    for records in _iter_csv_records(source, table, chunksize):
+        inserts, updates = [], []
+        for record in records:
+            if any(record.get(name) is None for name in key_columns):
+                raise ValueError(f"Every row needs {', '.join(key_columns)} in {mode} mode.")
+            key = tuple(record[name] for name in key_columns)
+            if key in seen: continue
+            seen.add(key)
+            values = tuple(record.get(name) for name in value_columns)
+            if key not in existing: inserts.append(record)
+            elif existing[key] != values:
+                updates.append({**{f'key_{name}': record[name] for name in key_columns}, **dict(zip(value_columns, values))})
+            else: stats["unchanged"] += 1
+        if inserts: connection.execute(table.insert(), inserts)
+        if updates and value_columns: connection.execute(update, updates)
+        stats["inserted"] += len(inserts); stats["updated"] += len(updates)
+    if mode == 'diff':
+        missing = [{f'key_{name}': value for name, value in zip(key_columns, key)} for key in existing if key not in seen]
+        if missing: connection.execute(table.delete().where(key_match), missing)
+        stats["deleted"] = len(missing)
+    return stats
+
+def load_csv_to_db(file_path, db_model, db_session, mode='replace'):
     """
     Reads a CSV file and loads its content into the specified database table.
-    
-    This function now deletes all existing data in the table before loading
-    the new data and gracefully handles completely empty files.
+
+    By default all existing data in the table is replaced; see ingest_csv for the
+    upsert and diff modes. Completely empty files are handled gracefully.
     """
     try:
-        # --- FIX: Delete all existing records from this table first ---
-        db_session.query(db_model).delete()
-        
-        # Attempt to read the CSV file
-        df = pd.read_csv(file_path)
-        
-        # If the dataframe is empty (e.g., only has headers), commit and return
-        if df.empty:
-            db_session.commit()
-            print(f"✅ Processed file with no data for '{db_model.__tablename__}'. Table is now empty.")
-            return
-
-        # Convert dataframe to a list of dictionaries to insert
-        records = df.to_dict(orient='records')
-        
-        # Insert the new data
-        db_session.bulk_insert_mappings(db_model, records)
+        stats = ingest_csv(file_path, db_model, db_session.connection(), mode=mode)
         db_session.commit()
-        
-        print(f"✅ Successfully loaded {len(records)} records from {file_path} into '{db_model.__tablename__}' table.")
-        
-    except EmptyDataError:
-        # --- FIX: Specifically catch the error for a completely empty file ---
-        # This is a valid state, especially for feedback. Commit the deletion.
-        db_session.commit()
-        print(f"✅ Cleared and processed empty file for '{db_model.__tablename__}'. Table is now empty.")
+        print(f"✅ Loaded {file_path} into '{db_model.__tablename__}': {stats}")
+        return stats
 
     except FileNotFoundError:
         print(f"❌ Error: The file {file_path} was not found.")
@@ -43,4 +99,3 @@ def load_csv_to_db(file_path, db_model, db_session):
         db_session.rollback()
         # Re-raise the exception to provide detailed error info in the console
         raise e
-